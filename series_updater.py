@@ -21,16 +21,23 @@ import sys
 import json
 import logging
 import argparse
-import yaml
 import re
-import bencodepy
 import hashlib
 import urllib
+import threading
+import time
+import random
+import codecs
+import functools
+from collections import deque
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from requests.adapters import HTTPAdapter
 from yarl import URL
+from typing import NamedTuple
 from logging.handlers import RotatingFileHandler
 from json import JSONDecodeError
 from datetime import datetime
-from lxml import html
 
 
 __version__ = '0.11.6'
@@ -49,19 +56,622 @@ ANILIBRIA = {'anilibria_id': ['anilibria.tv'], 'sep': ''}
 TRACKERS = [RUTOR, NNMCLUB, TORRENTBY, KINOZAL, RUTRACKER, ANIDUB, ANILIBRIA, NEWSTUDIO, PIRATBIT]
 
 
+def build_trackers_index(trackers):
+    """Index of trackers by host: {domain: (tracker_name_id, sep)}"""
+    index = dict()
+    for tracker in trackers:
+        tracker_name_id, tracker_url_patterns = list(tracker.items())[0]
+        _, sep = list(tracker.items())[1]
+        for domain in tracker_url_patterns:
+            index[domain] = (tracker_name_id, sep)
+    return index
+
+
+TRACKERS_BY_HOST = build_trackers_index(TRACKERS)
+
+# compiled XPath objects are kept per thread, lxml does not guarantee they are thread safe
+_xpath_cache = threading.local()
+
+
+def compile_xpath(expression):
+    from lxml import etree
+    compiled = getattr(_xpath_cache, 'compiled', None)
+    if compiled is None:
+        compiled = _xpath_cache.compiled = dict()
+    xpath = compiled.get(expression)
+    if xpath is None:
+        xpath = compiled[expression] = etree.XPath(expression, smart_strings=False)
+    return xpath
+
+
+class TrackerPage(object):
+    """Tracker page for extractors: html document is parsed once and shared by all of them
+
+    Text may be given as callable, it is called on first use (partial pages of streamed download).
+    """
+
+    def __init__(self, text, url=None, tree=None):
+        self._text = text
+        self.url = url
+        self._tree = tree
+        self._stripped = dict()
+        # parsing done while page was streamed, seconds without waiting for body chunks
+        self.parse_seconds = 0.0
+
+    @property
+    def text(self):
+        if callable(self._text):
+            self._text = self._text()
+        return self._text
+
+    @classmethod
+    def wrap(cls, page, url=None):
+        if isinstance(page, TrackerPage):
+            return page
+        return cls(text=page, url=url)
+
+    @property
+    def tree(self):
+        if self._tree is None:
+            from lxml import html
+            self._tree = html.fromstring(self.text)
+        return self._tree
+
+    def xpath(self, expression):
+        return compile_xpath(expression)(self.tree)
+
+    def first(self, expression):
+        result = self.xpath(expression)
+        if result:
+            return result[0]
+        return None
+
+    def stripped(self, chars='\n'):
+        """Page text without given chars, for regexp extractors"""
+        text = self._stripped.get(chars)
+        if text is None:
+            text = self.text
+            for char in chars:
+                text = text.replace(char, '')
+            self._stripped[chars] = text
+        return text
+
+
+class TokenBucket(object):
+    """Token bucket rate limiter: rate requests per second, up to capacity requests in a burst after idle time"""
+
+    def __init__(self, rate, capacity=1):
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        """Take one token, waits until it is available
+
+        :return: waited time, seconds
+        """
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            # token is reserved even if bucket is empty, so waiting threads are served in order
+            self._tokens -= 1
+            wait = -self._tokens / self.rate if self._tokens < 0 else 0
+        if wait > 0:
+            time.sleep(wait)
+        return wait
+
+
+class HostHealth(object):
+    """Observed latency and consecutive failures of one host
+
+    Request timeout is derived from p95 of recent latencies while host answers,
+    after failures_limit consecutive failures host is considered down (circuit is open)
+    for reset_after seconds, then one probe request is let through (half open): other requests are skipped
+    until its result is recorded, its failure opens circuit at once.
+    """
+
+    samples = 50
+    min_samples = 5
+    timeout_factor = 3
+    min_timeout = 3
+
+    def __init__(self, failures_limit=5, reset_after=15 * 60):
+        self.failures_limit = failures_limit
+        self.reset_after = reset_after
+        self.failures = 0
+        self.opened_at = None
+        # time when probe request of half open circuit was let through
+        self.probe_at = None
+        self._latencies = deque(maxlen=self.samples)
+        self._lock = threading.Lock()
+
+    def p95(self):
+        with self._lock:
+            latencies = sorted(self._latencies)
+        if len(latencies) < self.min_samples:
+            return None
+        return latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))]
+
+    def get_timeout(self, default):
+        """Timeout for next request, default one right after failure or until enough latencies observed"""
+        p95 = self.p95()
+        if p95 is None or self.failures:
+            return default
+        return min(default, max(self.min_timeout, p95 * self.timeout_factor))
+
+    def is_down(self, now=None):
+        with self._lock:
+            if (self.opened_at is None) and (self.probe_at is None):
+                return False
+            if now is None:
+                now = time.monotonic()
+            # probe without recorded result does not block host for longer than reset_after either
+            since = self.opened_at if self.opened_at is not None else self.probe_at
+            if now - since >= self.reset_after:
+                # half open: let only this request through, its failure opens circuit again
+                self.opened_at = None
+                self.probe_at = now
+                self.failures = max(self.failures_limit - 1, 0)
+                return False
+            return True
+
+    def record(self, ok, latency=None, now=None):
+        with self._lock:
+            self.probe_at = None
+            if ok:
+                self.failures = 0
+                if latency is not None:
+                    self._latencies.append(latency)
+                return
+            self.failures += 1
+            if self.failures_limit and (self.failures >= self.failures_limit) and (self.opened_at is None):
+                self.opened_at = time.monotonic() if now is None else now
+                logging.warning(f'Host is down after {self.failures} failures in a row, '
+                                f'requests are skipped for {self.reset_after} s')
+
+
+def make_session(pool_size=10, proxy=None):
+    """requests session with connection pool for pool_size simultaneous connections to one host
+
+    Session is shared by worker threads: pools are thread-safe, connections are kept alive and reused,
+    session headers are never changed after creation, headers are passed with each request instead.
+    """
+    session = requests.Session()
+    # with pool_block, extra thread waits for free connection instead of opening one, discarded after use
+    adapter = HTTPAdapter(pool_connections=10, pool_maxsize=pool_size, pool_block=True)
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    if proxy:
+        session.proxies = {'http': proxy, 'https': proxy}
+    return session
+
+
+def make_http2_client(pool_size=10):
+    """httpx client with HTTP/2 for https hosts, None if httpx[http2] package is not installed"""
+    try:
+        import httpx
+        import h2  # noqa: F401
+    except ImportError:
+        logging.warning('HTTP/2 needs httpx[http2] package, HTTP/1.1 is used')
+        return None
+    limits = httpx.Limits(max_connections=None, max_keepalive_connections=pool_size)
+    return httpx.Client(http2=True, limits=limits, follow_redirects=True)
+
+
+class Http2Response(object):
+    """Response of httpx client with attributes of requests response used by sources"""
+
+    def __init__(self, resp):
+        self._resp = resp
+        self.status_code = resp.status_code
+        self.reason = resp.reason_phrase
+        self.headers = resp.headers
+        self.url = str(resp.url)
+        self.content = resp.content
+        self.encoding = resp.encoding
+
+    def __bool__(self):
+        return self.status_code < 400
+
+    @property
+    def text(self):
+        return self.content.decode(self.encoding or 'utf-8', errors='replace')
+
+    def json(self):
+        return json.loads(self.content)
+
+    def close(self):
+        self._resp.close()
+
+
+class Metrics(object):
+    """Counters, gauges and histograms of the process, shared by all threads
+
+    Values are cumulative since start (or reset), in daemon mode too, as Prometheus counters are expected to be.
+    Report is written as JSON and as Prometheus text exposition, the latter may be served on /metrics.
+    """
+
+    prefix = 'ts_series_updater_'
+    # name => (type, help)
+    names = {
+        'requests_total': ('counter', 'HTTP requests sent, by host and status'),
+        'requests_skipped_total': ('counter', 'HTTP requests not sent because host is down, by host'),
+        'response_bytes_total': ('counter', 'Bytes of response bodies read, by host'),
+        'request_duration_seconds': ('histogram', 'HTTP request latency, by host'),
+        'parse_duration_seconds': ('histogram', 'Tracker page parsing and values extraction time, by source class'),
+        'topics_total': ('counter', 'Tracker topics, by tracker and check result'),
+        'updates_found_total': ('counter', 'Series updates found, by tracker'),
+        'torrents_added_total': ('counter', 'Torrents added to TorrServer'),
+        'torrents_cleaned_total': ('counter', 'Old torrents deleted from TorrServer'),
+        'run_duration_seconds': ('gauge', 'Duration of the last update pass'),
+        'last_run_timestamp_seconds': ('gauge', 'Unix time of the end of the last update pass'),
+    }
+    buckets = {
+        'request_duration_seconds': (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30),
+        'parse_duration_seconds': (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 1),
+    }
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._values = dict()
+        self._server = None
+
+    def reset(self):
+        with self._lock:
+            self._values.clear()
+
+    @staticmethod
+    def _key(name, labels):
+        return name, tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+    def count(self, name, value=1, **labels):
+        key = self._key(name, labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + value
+
+    def set(self, name, value, **labels):
+        with self._lock:
+            self._values[self._key(name, labels)] = value
+
+    def observe(self, name, value, **labels):
+        """Add value to histogram: counts of values per bucket (not cumulative), sum and count"""
+        key = self._key(name, labels)
+        bounds = self.buckets[name]
+        with self._lock:
+            histogram = self._values.get(key)
+            if histogram is None:
+                histogram = self._values[key] = {'buckets': [0] * (len(bounds) + 1), 'sum': 0.0, 'count': 0}
+            index = next((i for i, bound in enumerate(bounds) if value <= bound), len(bounds))
+            histogram['buckets'][index] += 1
+            histogram['sum'] += value
+            histogram['count'] += 1
+
+    def get(self, name, **labels):
+        with self._lock:
+            value = self._values.get(self._key(name, labels))
+        return dict(value, buckets=list(value['buckets'])) if isinstance(value, dict) else value
+
+    def _snapshot(self):
+        with self._lock:
+            return sorted((key, dict(value, buckets=list(value['buckets'])) if isinstance(value, dict) else value)
+                          for key, value in self._values.items())
+
+    def to_dict(self):
+        """Report for JSON: name => list of values with labels, histogram buckets are cumulative as in Prometheus"""
+        report = dict()
+        for (name, labels), value in self._snapshot():
+            item = {'labels': dict(labels)}
+            if isinstance(value, dict):
+                cumulative = [sum(value['buckets'][:i + 1]) for i in range(len(value['buckets']))]
+                bounds = [str(bound) for bound in self.buckets[name]] + ['+Inf']
+                item |= {'count': value['count'], 'sum': round(value['sum'], 6),
+                         'buckets': dict(zip(bounds, cumulative))}
+            else:
+                item['value'] = value
+            report.setdefault(name, list()).append(item)
+        return report
+
+    @staticmethod
+    def _labels(labels, extra=()):
+        labels = tuple(labels) + tuple(extra)
+        if not labels:
+            return ''
+        escaped = [(k, v.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')) for k, v in labels]
+        return '{' + ','.join(f'{k}="{v}"' for k, v in escaped) + '}'
+
+    def to_prometheus(self):
+        """Prometheus text exposition format, version 0.0.4"""
+        lines = list()
+        described = set()
+        for (name, labels), value in self._snapshot():
+            metric = f'{self.prefix}{name}'
+            if name not in described:
+                described.add(name)
+                metric_type, metric_help = self.names.get(name, ('untyped', name))
+                lines += [f'# HELP {metric} {metric_help}', f'# TYPE {metric} {metric_type}']
+            if isinstance(value, dict):
+                cumulative = 0
+                for bound, bucket_count in zip(list(self.buckets[name]) + ['+Inf'], value['buckets']):
+                    cumulative += bucket_count
+                    lines.append(f'{metric}_bucket{self._labels(labels, [("le", str(bound))])} {cumulative}')
+                lines.append(f'{metric}_sum{self._labels(labels)} {value["sum"]}')
+                lines.append(f'{metric}_count{self._labels(labels)} {value["count"]}')
+            else:
+                lines.append(f'{metric}{self._labels(labels)} {value}')
+        return '\n'.join(lines) + '\n'
+
+    @staticmethod
+    def _write_atomic(path, text):
+        # textfile collector may read file at any moment, so it is replaced at once
+        folder = os.path.dirname(os.path.abspath(path))
+        os.makedirs(folder, exist_ok=True)
+        tmp_path = f'{path}.{os.getpid()}.tmp'
+        with open(tmp_path, mode='w', encoding='utf-8') as metrics_file:
+            metrics_file.write(text)
+        os.replace(tmp_path, path)
+
+    def write(self, json_path=None, textfile_path=None):
+        try:
+            if json_path:
+                self._write_atomic(json_path, json.dumps(self.to_dict(), ensure_ascii=False, indent=2))
+            if textfile_path:
+                self._write_atomic(textfile_path, self.to_prometheus())
+        except OSError as e:
+            logging.warning(f'Metrics not written: {e}')
+
+    def serve(self, port, host=''):
+        """Serve /metrics in background thread
+
+        :return: http server, port 0 means any free port (see server.server_address)
+        """
+        from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+        metrics = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def do_GET(self):
+                if self.path.split('?')[0] != '/metrics':
+                    self.send_error(404)
+                    return
+                body = metrics.to_prometheus().encode('utf-8')
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+        self._server = ThreadingHTTPServer((host, port), Handler)
+        self._server.daemon_threads = True
+        threading.Thread(target=self._server.serve_forever, name='metrics', daemon=True).start()
+        logging.info(f'Metrics are served on http://{host or "0.0.0.0"}:{self._server.server_address[1]}/metrics')
+        return self._server
+
+    def stop(self):
+        if self._server:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+
+
+METRICS = Metrics()
+
+
+class Profiler(object):
+    """cProfile of all threads and wall-clock spans of update phases, off until started
+
+    Every thread started while profiler is on gets its own cProfile.Profile (python 3.12+ profiles
+    all threads with one), stats of all threads are merged to one pstats file.
+    Spans are written in Chrome trace format, it is opened by chrome://tracing, Perfetto or speedscope.
+    """
+
+    def __init__(self):
+        self.enabled = False
+        self._lock = threading.Lock()
+        self._profiles = list()
+        self._spans = list()
+        self._threads = dict()
+        self._origin = 0
+
+    def start(self):
+        import cProfile
+        self._profiles = [cProfile.Profile()]
+        self._spans = list()
+        self._threads = dict()
+        self._origin = time.perf_counter()
+        self.enabled = True
+        if sys.version_info < (3, 12):
+            threading.setprofile(self._thread_profile)
+        self._profiles[0].enable()
+
+    def _thread_profile(self, *args):
+        # called by threading for the first event in each new thread
+        import cProfile
+        sys.setprofile(None)
+        profile = cProfile.Profile()
+        with self._lock:
+            self._profiles.append(profile)
+        profile.enable()
+
+    def stop(self, folder):
+        """Stop profiling, write profile.pstats, profile.txt and trace.json to folder and log phases breakdown"""
+        import pstats
+        import io
+        self._profiles[0].disable()
+        threading.setprofile(None)
+        self.enabled = False
+        stats = None
+        with self._lock:
+            profiles = list(self._profiles)
+        for profile in profiles:
+            try:
+                if stats is None:
+                    stats = pstats.Stats(profile)
+                else:
+                    stats.add(profile)
+            except TypeError:
+                # thread without any profiled calls
+                continue
+        os.makedirs(folder, exist_ok=True)
+        if stats:
+            stats.dump_stats(os.path.join(folder, 'profile.pstats'))
+            report = io.StringIO()
+            stats.stream = report
+            stats.sort_stats('cumulative').print_stats(60)
+            with open(os.path.join(folder, 'profile.txt'), mode='w', encoding='utf-8') as report_file:
+                report_file.write(report.getvalue())
+        with open(os.path.join(folder, 'trace.json'), mode='w', encoding='utf-8') as trace_file:
+            json.dump(self.trace(), trace_file, ensure_ascii=False)
+        for line in self.breakdown():
+            logging.info(line)
+        logging.info(f'Profile and trace are written to {folder}')
+
+    @contextmanager
+    def span(self, name, cat, **args):
+        """Wall-clock span of the code in with block, yields dict of span args for values known at the end"""
+        if not self.enabled:
+            yield args
+            return
+        started = time.perf_counter()
+        try:
+            yield args
+        finally:
+            finished = time.perf_counter()
+            thread = threading.current_thread()
+            with self._lock:
+                self._threads[thread.ident] = thread.name
+                self._spans.append((name, cat, started, finished, thread.ident, args))
+
+    def traced(self, cat, name=None):
+        """Decorator, every call of function is a span"""
+        def decorator(func):
+            span_name = name or func.__name__
+
+            @functools.wraps(func)
+            def wrapper(*args, **kwargs):
+                if not self.enabled:
+                    return func(*args, **kwargs)
+                with self.span(span_name, cat):
+                    return func(*args, **kwargs)
+            return wrapper
+        return decorator
+
+    def trace(self):
+        """Chrome trace: complete events with microseconds timestamps and threads names"""
+        pid = os.getpid()
+        with self._lock:
+            spans = list(self._spans)
+            threads = dict(self._threads)
+        events = [{'name': 'thread_name', 'ph': 'M', 'pid': pid, 'tid': tid, 'args': {'name': thread_name}}
+                  for tid, thread_name in threads.items()]
+        for name, cat, started, finished, tid, args in spans:
+            events.append({'name': name, 'cat': cat, 'ph': 'X', 'pid': pid, 'tid': tid,
+                           'ts': round((started - self._origin) * 1e6, 1),
+                           'dur': round((finished - started) * 1e6, 1),
+                           'args': {k: str(v) for k, v in args.items()}})
+        return {'traceEvents': events, 'displayTimeUnit': 'ms'}
+
+    def breakdown(self, top=10):
+        """Summary lines: total time of spans by phase and the slowest span names of each phase
+
+        Spans of parallel workers overlap, so sum of phase may be more than wall time of the run.
+        """
+        with self._lock:
+            spans = list(self._spans)
+        phases = dict()
+        for name, cat, started, finished, _, _ in spans:
+            phase = phases.setdefault(cat, dict())
+            count, total = phase.get(name, (0, 0.0))
+            phase[name] = (count + 1, total + finished - started)
+        lines = list()
+        for cat, names in sorted(phases.items(), key=lambda item: -sum(t for _, t in item[1].values())):
+            lines.append(f'Profile: {cat}: {sum(c for c, _ in names.values())} spans, '
+                         f'{sum(t for _, t in names.values()):.2f} s')
+            for name, (count, total) in sorted(names.items(), key=lambda item: -item[1][1])[:top]:
+                lines.append(f'Profile:     {name}: {count} spans, {total:.2f} s, avg {total / count * 1000:.1f} ms')
+        return lines
+
+
+PROFILER = Profiler()
+
+
 class TorrentsSource(object):
+
+    # max simultaneous requests to one host, shared by all sources in the process
+    host_limit = 2
+    # data extracted from topic page may be reused while page is not modified
+    cacheable = True
+    magnet_xpath = '//a/@href'
+    title_xpath = None
+    poster_xpath = None
+    # topic page may be downloaded partially, until all extractors have values
+    streaming = False
+    stream_chunk_size = 16 * 1024
+    # force page encoding
+    encoding = None
+    # connections kept alive to one host, not less than host_limit
+    pool_size = 10
+    # source may use HTTP/2 client, if it is enabled
+    http2 = True
+    # max requests per second to one host, 0 - not limited, short bursts up to rate_burst requests are allowed
+    rate_limit = 0
+    rate_burst = 1
+    # retries of get/head requests failed with connection error or one of retry_statuses,
+    # delay before retry is random, up to retry_backoff * 2 ** attempt seconds, but not more than retry_backoff_max
+    retries = 2
+    retry_backoff = 1.0
+    retry_backoff_max = 30
+    retry_statuses = frozenset({429, 500, 502, 503, 504})
+    retry_methods = frozenset({'get', 'head'})
+    # request timeout is derived from observed latency of host
+    adaptive_timeout = True
+    # host is not requested after so many failures in a row, 0 - never
+    circuit_failures = 5
+    circuit_reset_after = 15 * 60
+    _host_semaphores: dict = dict()
+    # domains of tracker, topic urls are made with url_template for the fastest one,
+    # order of mirrors by latency is cached for mirror_ttl seconds
+    mirrors = ()
+    url_template = ''
+    mirror_ttl = 24 * 3600
+    probe_timeout = 5
+    _host_semaphores_lock = threading.Lock()
+    _host_buckets: dict = dict()
+    _hosts_health: dict = dict()
+    _mirrors_lock = threading.Lock()
+
     def __init__(self, *args, **kwargs):
         self.unknown_response = type('obj', (object,), {'status_code': 520, 'reason': 'Unknown Error', 'text': ''})
+        self.host_down_response = type('obj', (object,), {'status_code': 521, 'reason': 'Host Is Down', 'text': ''})
         self._server_url = None
         self._secrets: dict = dict()
         self._url_pattern = kwargs.get('server_url', 'http://127.0.0.1')
-        self._session = requests.Session()
         self.torrents_list: list = list()
         self._login = None
         self._password = None
         self._proxy = kwargs.get('proxy', dict())
-        if self._proxy:
-            self._session.proxies = {'http': self._proxy, 'https': self._proxy}
+        self.host_limit = kwargs.get('host_limit') or self.host_limit
+        self.pool_size = max(kwargs.get('pool_size') or self.pool_size, self.host_limit)
+        self._session = make_session(pool_size=self.pool_size, proxy=self._proxy)
+        self._http2_client = None
+        if kwargs.get('http2') and self.http2:
+            if self._proxy:
+                logging.warning('HTTP/2 is not used with proxy')
+            else:
+                self._http2_client = make_http2_client(pool_size=self.pool_size)
+        self.rate_limit = kwargs.get('rate_limit', self.rate_limit)
+        self.retries = kwargs.get('retries', self.retries)
+        self.retry_backoff = kwargs.get('retry_backoff', self.retry_backoff)
+        self.mirror = None
+        self._mirror_order = list(self.mirrors)
+        self._cache_dir = kwargs.get('cache_dir')
+        self._mirrors_checked = 0
+        if self.mirrors:
+            self.use_mirror(self.mirrors[0])
 
     def _get_auth(self):
         self._session.auth = (self._login, self._password)
@@ -101,59 +711,386 @@ class TorrentsSource(object):
         logging.warning('No secrets loaded!')
         return dict()
 
+    def _host_semaphore(self, url):
+        host = urllib.parse.urlsplit(str(url)).hostname
+        with TorrentsSource._host_semaphores_lock:
+            semaphore = TorrentsSource._host_semaphores.get(host)
+            if semaphore is None:
+                semaphore = threading.BoundedSemaphore(self.host_limit)
+                TorrentsSource._host_semaphores[host] = semaphore
+        return semaphore
+
+    def _host_bucket(self, url):
+        if not self.rate_limit:
+            return None
+        host = urllib.parse.urlsplit(str(url)).hostname
+        with TorrentsSource._host_semaphores_lock:
+            bucket = TorrentsSource._host_buckets.get(host)
+            if bucket is None:
+                bucket = TokenBucket(rate=self.rate_limit, capacity=self.rate_burst)
+                TorrentsSource._host_buckets[host] = bucket
+        return bucket
+
+    def host_health(self, url):
+        host = urllib.parse.urlsplit(str(url)).hostname
+        with TorrentsSource._host_semaphores_lock:
+            health = TorrentsSource._hosts_health.get(host)
+            if health is None:
+                health = HostHealth(failures_limit=self.circuit_failures, reset_after=self.circuit_reset_after)
+                TorrentsSource._hosts_health[host] = health
+        return health
+
+    @staticmethod
+    def _release_on_close(resp, semaphore):
+        close = resp.close
+        released = threading.Lock()
+
+        def close_and_release():
+            try:
+                close()
+            finally:
+                if released.acquire(blocking=False):
+                    semaphore.release()
+
+        resp.close = close_and_release
+
+    def _retry_delay(self, attempt, resp):
+        """Delay before next attempt: Retry-After of response or exponential backoff with full jitter"""
+        retry_after = getattr(resp, 'headers', None) and resp.headers.get('Retry-After')
+        if retry_after and str(retry_after).isdigit():
+            return min(int(retry_after), self.retry_backoff_max)
+        return random.uniform(0, min(self.retry_backoff_max, self.retry_backoff * 2 ** attempt))
+
     def _server_request(self, r_type: str = 'get', url=None, pref: str = '', data: dict = None, timeout: int = 10,
-                        headers: dict = None, is_json: bool = False, verify: bool = True):
+                        headers: dict = None, is_json: bool = False, verify: bool = True, stream: bool = False,
+                        retries: int = None):
         if data is None:
             data = dict()
         if pref:
             pref = f'/{pref}'
         if url is None:
             url = f'{self._server_url}{pref}'
-        if headers:
-            self._session.headers.update(headers)
         logging.debug(f'Proxy settings: {self._session.proxies}')
-        try:
-            logging.debug(url)
-            if r_type == 'get':
-                resp = self._session.get(url=url, headers=headers, timeout=timeout, verify=verify)
-            elif r_type == 'post':
-                if is_json:
-                    resp = self._session.post(url=url, headers=headers, json=data, timeout=timeout, verify=verify)
-                else:
-                    resp = self._session.post(url=url, headers=headers, data=data, timeout=timeout, verify=verify)
+        logging.debug(url)
+        health = self.host_health(url)
+        host = urllib.parse.urlsplit(str(url)).hostname
+        if retries is None:
+            retries = self.retries
+        attempts = 1 + (retries if r_type in self.retry_methods else 0)
+        for attempt in range(attempts):
+            # health of host is shared by all sources, source without circuit breaker always sends requests
+            if self.circuit_failures and health.is_down():
+                logging.debug(f'{url} => host is down, request skipped')
+                METRICS.count('requests_skipped_total', host=host)
+                return self.host_down_response
+            bucket = self._host_bucket(url)
+            if bucket:
+                bucket.acquire()
+            error = None
+            request_timeout = health.get_timeout(timeout) if self.adaptive_timeout else timeout
+            started = time.monotonic()
+            semaphore = self._host_semaphore(url)
+            semaphore.acquire()
+            try:
+                with PROFILER.span(host, 'http', url=url) as span_args:
+                    resp = self._send(r_type=r_type, url=url, data=data, timeout=request_timeout, headers=headers,
+                                      is_json=is_json, verify=verify, stream=stream)
+                    span_args['status'] = resp.status_code
+            except Exception as e:
+                error = e
+                resp = self.unknown_response
+            if stream and (error is None):
+                # body of streamed response is downloaded later, host slot is taken until response is closed
+                self._release_on_close(resp=resp, semaphore=semaphore)
             else:
-                if is_json:
-                    resp = self._session.head(url=url, headers=headers, json=data, timeout=timeout, verify=verify)
-                else:
-                    resp = self._session.head(url=url, headers=headers, data=data, timeout=timeout, verify=verify)
-        except Exception as e:
-            logging.error(e)
+                semaphore.release()
+            if error is None:
+                transient = resp.status_code in self.retry_statuses
+            else:
+                transient = isinstance(error, (requests.ConnectionError, requests.Timeout))
+            latency = time.monotonic() - started
+            health.record(ok=not transient, latency=latency)
+            METRICS.count('requests_total', host=host, status='error' if error is not None else resp.status_code)
+            METRICS.observe('request_duration_seconds', latency, host=host)
+            if error is None and not stream:
+                # streamed bodies are counted by read_page
+                METRICS.count('response_bytes_total', len(getattr(resp, 'content', None) or b''), host=host)
+            if not transient or (attempt + 1 == attempts):
+                break
+            delay = self._retry_delay(attempt=attempt, resp=resp)
+            logging.warning(f'{url} => {error or resp.status_code}, retry {attempt + 1} of {retries} '
+                            f'in {delay:.1f} s')
+            if error is None and stream:
+                resp.close()
+            time.sleep(delay)
+        if error is not None:
+            logging.error(error)
             logging.error(f'Connection problems with {url}')
-            # raise Exception
-            # sys.exit(1)
-            resp = self.unknown_response
         return resp
 
+    def _send_http2(self, r_type, url, data, timeout, headers, is_json):
+        import httpx
+        if r_type == 'get':
+            kwargs = dict()
+        elif is_json:
+            kwargs = {'json': data}
+        else:
+            kwargs = {'data': data}
+        try:
+            resp = self._http2_client.request(r_type.upper(), str(url), headers=headers, timeout=timeout, **kwargs)
+        except httpx.TimeoutException as e:
+            raise requests.Timeout(e)
+        except httpx.TransportError as e:
+            raise requests.ConnectionError(e)
+        return Http2Response(resp)
+
+    def _send(self, r_type, url, data, timeout, headers, is_json, verify, stream=False):
+        # HTTP/2 is negotiated with TLS only,
+        # streamed, not verified and plain http requests are sent by requests session
+        if (self._http2_client is not None) and verify and not stream and str(url).startswith('https://'):
+            return self._send_http2(r_type=r_type, url=url, data=data, timeout=timeout, headers=headers,
+                                    is_json=is_json)
+        if r_type == 'get':
+            return self._session.get(url=url, headers=headers, timeout=timeout, verify=verify, stream=stream)
+        elif r_type == 'post':
+            if is_json:
+                return self._session.post(url=url, headers=headers, json=data, timeout=timeout, verify=verify)
+            return self._session.post(url=url, headers=headers, data=data, timeout=timeout, verify=verify)
+        else:
+            if is_json:
+                return self._session.head(url=url, headers=headers, json=data, timeout=timeout, verify=verify)
+            return self._session.head(url=url, headers=headers, data=data, timeout=timeout, verify=verify)
+
     def server_request(self, *args, **kwargs):
         return self._server_request(*args, **kwargs)
 
-    def get_torrent_page(self, torrent_id):
+    def get_topic_url(self, torrent_id):
+        return f'{self._url_pattern}{torrent_id}'
+
+    def get_torrent_page(self, torrent_id, headers=None, stream=False):
         resp = None
         if self._url_pattern:
-            self._server_url = f'{self._url_pattern}{torrent_id}'
-            logging.debug(f'URL: {self._server_url}')
-            resp = self._server_request(r_type='get')
+            url = self.get_topic_url(torrent_id=torrent_id)
+            logging.debug(f'URL: {url}')
+            resp = self._server_request(r_type='get', url=url, headers=headers, stream=stream)
+            if self.failover(resp=resp, url=url):
+                # connection and host slot of failed streamed response are freed before the next request
+                if hasattr(resp, 'close'):
+                    resp.close()
+                resp = self._server_request(r_type='get', url=self.get_topic_url(torrent_id=torrent_id),
+                                            headers=headers, stream=stream)
         return resp
 
+    def use_mirror(self, mirror):
+        self._set_mirror(mirror)
+        self._mirror_changed()
+
+    def _set_mirror(self, mirror):
+        self.mirror = mirror
+        self._url_pattern = self.url_template.format(mirror=mirror)
+
+    def _mirror_changed(self):
+        """Called after mirror is switched, out of mirrors lock, so it may send requests"""
+
+    def probe_mirrors(self):
+        """Mirrors ordered by latency of main page request, unreachable ones are the last"""
+        def probe(mirror):
+            parts = urllib.parse.urlsplit(self.url_template.format(mirror=mirror))
+            started = time.monotonic()
+            # retry would add its delay to latency, unreachable mirror is just the last one
+            resp = self._server_request(r_type='get', url=f'{parts.scheme}://{parts.netloc}/',
+                                        timeout=self.probe_timeout, stream=True, retries=0)
+            if hasattr(resp, 'close'):
+                resp.close()
+            if resp.status_code < 500:
+                return time.monotonic() - started
+            logging.debug(f'Mirror {mirror}: {resp.status_code}')
+            return None
+
+        with ThreadPoolExecutor(max_workers=len(self.mirrors)) as executor:
+            latencies = dict(zip(self.mirrors, executor.map(probe, self.mirrors)))
+        logging.info('Mirrors latency: ' + ', '.join(f'{mirror}: {"-" if latency is None else f"{latency:.2f} s"}'
+                                                      for mirror, latency in latencies.items()))
+        return sorted(self.mirrors, key=lambda mirror: (latencies[mirror] is None, latencies[mirror] or 0))
+
     @staticmethod
-    def get_magnet(text, xpath='//a/@href'):
-        links = html.fromstring(text).xpath(xpath)
+    def _mirrors_file(cache_dir):
+        return os.path.join(cache_dir, 'mirrors.json') if cache_dir else None
+
+    def _load_mirrors(self, cache_dir):
+        try:
+            with open(self._mirrors_file(cache_dir), mode='r', encoding='utf-8') as mirrors_file:
+                entry = json.load(mirrors_file).get(type(self).__name__, dict())
+        except (TypeError, OSError, ValueError):
+            return None
+        if (time.time() - entry.get('checked', 0) > self.mirror_ttl) or \
+                (sorted(entry.get('mirrors', list())) != sorted(self.mirrors)):
+            return None
+        return entry.get('mirrors')
+
+    def _save_mirrors(self, cache_dir, order):
+        mirrors_file = self._mirrors_file(cache_dir)
+        if not mirrors_file:
+            return
+        with TorrentsSource._mirrors_lock:
+            try:
+                with open(mirrors_file, mode='r', encoding='utf-8') as f:
+                    saved = json.load(f)
+            except (OSError, ValueError):
+                saved = dict()
+            saved[type(self).__name__] = {'mirrors': list(order), 'checked': time.time()}
+            try:
+                os.makedirs(cache_dir, exist_ok=True)
+                tmp_path = f'{mirrors_file}.{threading.get_ident()}.tmp'
+                with open(tmp_path, mode='w', encoding='utf-8') as f:
+                    json.dump(saved, f)
+                os.replace(tmp_path, mirrors_file)
+            except OSError as e:
+                logging.warning(f'Mirrors cache: {e}')
+
+    def select_mirror(self):
+        """Use the fastest reachable mirror, order of mirrors is probed once per mirror_ttl
+
+        :return: selected mirror
+        """
+        if (len(self.mirrors) < 2) or (time.time() - self._mirrors_checked < self.mirror_ttl):
+            return self.mirror
+        order = self._load_mirrors(self._cache_dir)
+        if order is None:
+            order = self.probe_mirrors()
+            self._save_mirrors(self._cache_dir, order)
+        self._mirrors_checked = time.time()
+        self._mirror_order = list(order)
+        if order[0] != self.mirror:
+            logging.info(f'Mirror selected: {order[0]}')
+            self.use_mirror(order[0])
+        return self.mirror
+
+    def failover(self, resp, url):
+        """Switch to the next mirror, if request to the current one failed
+
+        :return: True if request should be repeated with the current mirror
+        """
+        if (len(self.mirrors) < 2) or (resp is not self.host_down_response and resp.status_code < 500):
+            return False
+        with TorrentsSource._mirrors_lock:
+            if urllib.parse.urlsplit(str(url)).hostname != self.mirror:
+                # already switched by another worker
+                return True
+            index = self._mirror_order.index(self.mirror)
+            candidates = self._mirror_order[index + 1:] + self._mirror_order[:index]
+            candidates = [m for m in candidates if not self.host_health(self.url_template.format(mirror=m)).is_down()]
+            if not candidates:
+                return False
+            failed = self.mirror
+            self._mirror_order = candidates + [failed]
+            self._set_mirror(candidates[0])
+        self._mirror_changed()
+        logging.warning(f'Mirror {failed} => {resp.status_code}, switched to {self.mirror}')
+        # next runs start with working mirror too, until order is probed again
+        self._save_mirrors(self._cache_dir, self._mirror_order)
+        return True
+
+    @classmethod
+    def read_page(cls, resp, url, stream=False):
+        """Make TrackerPage from response
+
+        With stream, response body is fed by chunks to incremental parser and download is stopped
+        as soon as title, magnet and poster are found and confirmed by the next extraction.
+        Extractors run again only after new elements are parsed, value confirmed once is not extracted again,
+        text of partial page is decoded only if extractor needs it.
+        resp.content holds only downloaded part of the page then,
+        time of parsing without waiting for chunks is in parse_seconds of the page.
+        """
+        if not stream:
+            return TrackerPage(text=resp.text, url=url)
+        from lxml import html, etree
+        # response is closed whatever happens, its host slot is released on close
+        try:
+            content_type = resp.headers.get('Content-Type', '').lower()
+            encoding = resp.encoding if (resp.encoding and (cls.encoding or 'charset' in content_type)) else None
+            if encoding:
+                try:
+                    codecs.lookup(encoding)
+                except LookupError:
+                    logging.debug(f'{url} => unknown charset {encoding}, utf-8 is used')
+                    encoding = 'utf-8'
+            parser = etree.HTMLPullParser(events=('start',), encoding=encoding)
+            parser.set_element_class_lookup(html.HtmlElementClassLookup())
+            decoder = codecs.getincrementaldecoder(encoding or 'utf-8')(errors='replace')
+            chunks = list()
+            decoded = list()
+
+            def partial_text():
+                decoded.extend(decoder.decode(chunk) for chunk in chunks[len(decoded):])
+                return ''.join(decoded)
+
+            extractors = (cls.get_title, cls.get_magnet, cls.get_poster)
+            values = [None] * len(extractors)
+            confirmed = [False] * len(extractors)
+            root = None
+            started = time.perf_counter()
+            download_seconds = 0.0
+            body = resp.iter_content(chunk_size=cls.stream_chunk_size)
+            while True:
+                wait_started = time.perf_counter()
+                chunk = next(body, None)
+                download_seconds += time.perf_counter() - wait_started
+                if chunk is None:
+                    break
+                chunks.append(chunk)
+                parser.feed(chunk)
+                events = parser.read_events()
+                new_elements = False
+                for _, element in events:
+                    new_elements = True
+                    if root is None:
+                        root = element.getroottree().getroot()
+                if root is None or not new_elements:
+                    continue
+                partial_page = TrackerPage(text=partial_text, url=url, tree=root)
+                for index, extractor in enumerate(extractors):
+                    if not confirmed[index]:
+                        value = extractor(partial_page)
+                        confirmed[index] = (value is not None) and (value == values[index])
+                        values[index] = value
+                if all(confirmed):
+                    logging.debug(f'{url} => {sum(len(c) for c in chunks)} bytes read, all values found')
+                    break
+        finally:
+            resp.close()
+        try:
+            root = parser.close()
+        except etree.XMLSyntaxError:
+            root = None
+        resp._content = b''.join(chunks)
+        resp._content_consumed = True
+        METRICS.count('response_bytes_total', len(resp._content), host=urllib.parse.urlsplit(str(url)).hostname)
+        page = TrackerPage(text=resp.text, url=url, tree=root)
+        page.parse_seconds = time.perf_counter() - started - download_seconds
+        return page
+
+    @classmethod
+    def get_magnet(cls, page):
+        links = TrackerPage.wrap(page).xpath(cls.magnet_xpath)
         for link in links:
             if 'magnet' in link:
                 logging.debug(f'{link}')
                 return str(link).lower()
         return None
 
+    @classmethod
+    def get_title(cls, page):
+        if cls.title_xpath:
+            return TrackerPage.wrap(page).first(cls.title_xpath)
+        return None
+
+    @classmethod
+    def get_poster(cls, page):
+        if cls.poster_xpath:
+            return TrackerPage.wrap(page).first(cls.poster_xpath)
+        return None
+
     @staticmethod
     def get_hash_from_magnet(magnet_link):
         if magnet_link:
@@ -175,34 +1112,343 @@ class TorrentsSource(object):
                 torrents[torrent_id] = lst_w_same_id
         return torrents
 
+    @staticmethod
+    def get_torrent_id(url, sep='/'):
+        """Get topic id from tracker link, if sep is empty the link itself is used as id"""
+        if sep:
+            try:
+                clean_url = url.split('&')[0]
+                scratches = clean_url.split(sep)
+                for part in scratches:
+                    if part.isdecimal():
+                        return part
+            except Exception as e:
+                logging.error(e)
+                return None
+        else:
+            return url
+        return None
+
     @staticmethod
     def is_tracker_link(url, patterns=None, sep='/'):
         if patterns is None:
             patterns = list
         if url and any(domain in url for domain in patterns):
-            if sep:
-                try:
-                    clean_url = url.split('&')[0]
-                    scratches = clean_url.split(sep)
-                    for part in scratches:
-                        if part.isdecimal():
-                            return part
-                except Exception as e:
-                    logging.error(e)
-                    return None
-            else:
-                return url
+            return TorrentsSource.get_torrent_id(url=url, sep=sep)
+        return None
+
+    @staticmethod
+    def get_tracker_by_url(url, index=None):
+        """Find tracker by host of url, subdomains (www. etc.) are matched to the tracker domain
+
+        :return: (tracker_name_id, sep) or None
+        """
+        if not (url and isinstance(url, str)):
+            return None
+        if index is None:
+            index = TRACKERS_BY_HOST
+        try:
+            host = URL(url).host
+        except (ValueError, TypeError):
+            return None
+        while host:
+            tracker = index.get(host)
+            if tracker:
+                return tracker
+            host = host.partition('.')[2]
         return None
 
 
+class TorrServerRecord(NamedTuple):
+    """TorrServer torrent with decoded data field"""
+    t_hash: str
+    title: str
+    poster: str
+    timestamp: int
+    stat: int
+    stat_string: str
+    torrent_size: int
+    tsa_url: str
+    litrcc_url: str
+
+
+class PlannedUpdate(NamedTuple):
+    """New torrent of topic, replaces old torrents of the topic, viewed marks of old torrents are copied to it"""
+    source: str
+    topic_id: str
+    title: str
+    torrent: dict
+    old_hashes: tuple = ()
+    viewed: frozenset = frozenset()
+
+
+class UpdatePlan(object):
+    """Changes of TorrServer found by all modes, applied at once by TorrServer.apply_plan
+
+    Updates are collected from worker threads, update with the same new torrent found by several modes
+    (e.g. by tracker and litr.cc) is applied once with old torrents and viewed marks of all of them.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        # new hash => PlannedUpdate
+        self._updates = dict()
+        # hash => reason
+        self._removals = dict()
+
+    def add_update(self, update):
+        t_hash = update.torrent.get('hash')
+        with self._lock:
+            planned = self._updates.get(t_hash)
+            if planned:
+                update = planned._replace(old_hashes=tuple(dict.fromkeys(planned.old_hashes + update.old_hashes)),
+                                          viewed=planned.viewed | update.viewed)
+            self._updates[t_hash] = update
+
+    def remove(self, hashes, reason):
+        with self._lock:
+            for t_hash in hashes:
+                self._removals.setdefault(t_hash, reason)
+
+    @property
+    def updates(self):
+        with self._lock:
+            return list(self._updates.values())
+
+    @property
+    def removals(self):
+        """Torrents to delete without replacement, hash => reason"""
+        with self._lock:
+            return dict(self._removals)
+
+    def __len__(self):
+        with self._lock:
+            return len(self._updates) + len(self._removals)
+
+    def describe(self):
+        """Plan as log lines"""
+        lines = list()
+        for update in self.updates:
+            lines.append(f'Plan: {update.source} {update.topic_id}: {update.title} => '
+                         f'add {update.torrent.get("hash")}, {len(update.viewed)} viewed files, '
+                         f'remove {len(update.old_hashes)} old torrents')
+        for t_hash, reason in self.removals.items():
+            lines.append(f'Plan: remove {t_hash}, {reason}')
+        lines.append(f'Plan: {len(self.updates)} torrents to add, '
+                     f'{len({h for u in self.updates for h in u.old_hashes} | set(self.removals))} to remove')
+        return lines
+
+
+class PageCache(object):
+    """On-disk cache for tracker pages
+
+    Keeps ETag/Last-Modified of page and data extracted from it (title, magnet, poster),
+    so page, not modified since last run, is neither downloaded nor parsed again.
+    One json file per url, the oldest used entries are removed when cache grows over max_size.
+    Read only cache (dry run) is used for requests, but neither entries nor their use times are written.
+    """
+
+    def __init__(self, path, max_size=10 * 1024 * 1024, read_only=False):
+        self._path = path
+        self._max_size = max_size
+        self.read_only = read_only
+        self._lock = threading.Lock()
+        os.makedirs(self._path, exist_ok=True)
+        self._size = sum(entry.stat().st_size for entry in os.scandir(self._path) if entry.name.endswith('.json'))
+
+    def _entry_path(self, url):
+        return os.path.join(self._path, f'{hashlib.sha1(str(url).encode("utf-8")).hexdigest()}.json')
+
+    def get(self, url):
+        entry_path = self._entry_path(url)
+        try:
+            with open(entry_path, mode='r', encoding='utf-8') as entry_file:
+                entry = json.load(entry_file)
+            if not self.read_only:
+                os.utime(entry_path)
+        except (OSError, ValueError):
+            return None
+        if entry.get('url') != str(url):
+            return None
+        return entry
+
+    @staticmethod
+    def validators(entry):
+        """Headers for conditional GET request"""
+        headers = dict()
+        if entry:
+            if entry.get('etag'):
+                headers['If-None-Match'] = entry.get('etag')
+            if entry.get('last_modified'):
+                headers['If-Modified-Since'] = entry.get('last_modified')
+        return headers
+
+    def put(self, url, resp, page):
+        etag = resp.headers.get('ETag')
+        last_modified = resp.headers.get('Last-Modified')
+        if self.read_only or not (etag or last_modified):
+            return
+        entry = {'url': str(url), 'etag': etag, 'last_modified': last_modified, 'page': page}
+        entry_path = self._entry_path(url)
+        tmp_path = f'{entry_path}.{threading.get_ident()}.tmp'
+        try:
+            old_size = os.path.getsize(entry_path) if os.path.isfile(entry_path) else 0
+            with open(tmp_path, mode='w', encoding='utf-8') as entry_file:
+                json.dump(entry, entry_file, ensure_ascii=False)
+            new_size = os.path.getsize(tmp_path)
+            os.replace(tmp_path, entry_path)
+        except OSError as e:
+            logging.warning(f'Page cache: {e}')
+            return
+        with self._lock:
+            self._size += new_size - old_size
+            if self._size > self._max_size:
+                self._evict()
+
+    def _evict(self):
+        try:
+            entries = sorted((entry for entry in os.scandir(self._path) if entry.name.endswith('.json')),
+                             key=lambda entry: entry.stat().st_mtime)
+        except OSError as e:
+            logging.warning(f'Page cache: {e}')
+            return
+        target_size = self._max_size * 0.9
+        for entry in entries:
+            if self._size <= target_size:
+                break
+            try:
+                size = entry.stat().st_size
+                os.remove(entry.path)
+                self._size -= size
+            except OSError:
+                pass
+        logging.debug(f'Page cache evicted, size: {self._size}')
+
+
+class StateStore(object):
+    """Local sqlite database with last seen state of every tracker topic
+
+    For each topic keeps last seen infohash, time of last check, time of last change
+    and page fingerprint, so topics confirmed unchanged recently may be skipped.
+    With max_recheck_after check interval is adaptive: it grows with time since the last change
+    of topic, from recheck_after for airing series up to max_recheck_after for finished ones.
+    Read only store (dry run) skips topics as usual, but does not record checks.
+    """
+
+    # check interval is this part of time passed since the last change
+    adapt_ratio = 0.1
+    # min check interval in daemon mode, seconds
+    daemon_recheck_after = 30 * 60
+
+    def __init__(self, path, recheck_after=0, max_recheck_after=0, read_only=False):
+        self._path = path
+        self.recheck_after = recheck_after
+        self.max_recheck_after = max_recheck_after
+        self.read_only = read_only
+        self._lock = threading.Lock()
+        if self._path != ':memory:':
+            os.makedirs(os.path.dirname(os.path.abspath(self._path)), exist_ok=True)
+        import sqlite3
+        self._conn = sqlite3.connect(self._path, check_same_thread=False)
+        try:
+            with self._lock, self._conn:
+                self._conn.execute('CREATE TABLE IF NOT EXISTS topics (tracker TEXT NOT NULL, '
+                                   'topic_id TEXT NOT NULL, infohash TEXT, last_check REAL, last_change REAL, '
+                                   'fingerprint TEXT, pending INTEGER NOT NULL DEFAULT 0, '
+                                   'PRIMARY KEY (tracker, topic_id))')
+                columns = [row[1] for row in self._conn.execute('PRAGMA table_info(topics)')]
+                if 'pending' not in columns:
+                    self._conn.execute('ALTER TABLE topics ADD COLUMN pending INTEGER NOT NULL DEFAULT 0')
+        except sqlite3.Error:
+            self._conn.close()
+            raise
+
+    def get(self, tracker, topic_id):
+        with self._lock:
+            row = self._conn.execute('SELECT infohash, last_check, last_change, fingerprint, pending FROM topics '
+                                     'WHERE tracker = ? AND topic_id = ?', (tracker, str(topic_id))).fetchone()
+        if row is None:
+            return None
+        return {'infohash': row[0], 'last_check': row[1], 'last_change': row[2], 'fingerprint': row[3],
+                'pending': bool(row[4])}
+
+    def get_pending(self, tracker):
+        """Topics of tracker skipped in previous runs because tracker was down"""
+        with self._lock:
+            rows = self._conn.execute('SELECT topic_id FROM topics WHERE tracker = ? AND pending = 1',
+                                      (tracker,)).fetchall()
+        return {row[0] for row in rows}
+
+    def mark_pending(self, tracker, topic_id):
+        if self.read_only:
+            return
+        with self._lock, self._conn:
+            self._conn.execute('INSERT OR IGNORE INTO topics (tracker, topic_id) VALUES (?, ?)',
+                               (tracker, str(topic_id)))
+            self._conn.execute('UPDATE topics SET pending = 1 WHERE tracker = ? AND topic_id = ?',
+                               (tracker, str(topic_id)))
+
+    def get_interval(self, topic, now):
+        """Check interval for topic, seconds"""
+        if self.max_recheck_after <= self.recheck_after:
+            return self.recheck_after
+        last_change = topic.get('last_change')
+        since_change = now - (now if last_change is None else last_change)
+        return min(max(since_change * self.adapt_ratio, self.recheck_after), self.max_recheck_after)
+
+    def is_fresh(self, tracker, topic_id, hashes, fingerprint=None, now=None):
+        """Topic was checked less than check interval ago and its last seen hash is on TorrServer"""
+        if not (self.recheck_after or self.max_recheck_after):
+            return False
+        topic = self.get(tracker=tracker, topic_id=topic_id)
+        if not topic or topic.get('pending') or (topic.get('infohash') not in hashes):
+            return False
+        if fingerprint is not None and fingerprint != topic.get('fingerprint'):
+            return False
+        if now is None:
+            now = time.time()
+        return (now - (topic.get('last_check') or 0)) < self.get_interval(topic=topic, now=now)
+
+    def update(self, tracker, topic_id, infohash, fingerprint=None, now=None):
+        if self.read_only:
+            return
+        if now is None:
+            now = time.time()
+        topic = self.get(tracker=tracker, topic_id=topic_id)
+        if topic and (topic.get('infohash') == infohash):
+            last_change = topic.get('last_change')
+        else:
+            last_change = now
+        with self._lock, self._conn:
+            self._conn.execute('INSERT OR REPLACE INTO topics (tracker, topic_id, infohash, last_check, last_change, '
+                               'fingerprint, pending) VALUES (?, ?, ?, ?, ?, ?, 0)',
+                               (tracker, str(topic_id), infohash, now, last_change, fingerprint))
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
 class TorrServer(TorrentsSource):
 
     tracker_id = 'torrserver'
+    # TorrServer is usually local, so more simultaneous requests are allowed than for trackers
+    host_limit = 8
+    pool_size = 16
+    # stat of torrent may wait for metadata from peers, its latency tells nothing about server,
+    # and its timeouts do not mean server is down
+    adaptive_timeout = False
+    circuit_failures = 0
+    # basic auth is set on requests session, TorrServer is usually local and plain http anyway
+    http2 = False
+    # stat of dead torrent times out every time, retries only multiply the wait
+    retries = 0
+    # deletion of so many torrents is checked with one list request
+    batch_check_size = 10
 
     def __init__(self, *args, **kwargs):
         # self._secrets = self.load_secrets()
-        super().__init__(*args, **kwargs)
-        self._session.proxies = dict()
+        super().__init__(*args, **kwargs | {'proxy': '', 'host_limit': TorrServer.host_limit})
         self._server_url = URL(kwargs.get('ts_url'))
         self._server_url: URL = URL.build(scheme=self._server_url.scheme, host=self._server_url.host,
                                           port=kwargs.get('ts_port'))
@@ -216,14 +1462,30 @@ class TorrServer(TorrentsSource):
 
         self.torrents_list: list = list()
         self.litrcc_torrents_list: list = list()
-        self.litrcc_torrents_cache: list = list()
-        self._raw = self._get_torrents_list()
+        # external_url => list of TorrServer torrents with this url
+        self.litrcc_torrents_index: dict = dict()
+        # serializes changes on TorrServer and reload of torrents list
+        self.lock = threading.RLock()
+        # hash => set of viewed files indexes, loaded with one request on first use
+        self._viewed = None
+        self._viewed_lock = threading.Lock()
+        self.records = self._normalize(raw=self._get_torrents_list())
         self._raw2struct()
 
+    def refresh(self):
+        """Reload torrents list from TorrServer"""
+        with self.lock:
+            self.torrents_list = list()
+            self.records = self._normalize(raw=self._get_torrents_list())
+            self._raw2struct()
+            with self._viewed_lock:
+                self._viewed = None
+
     @property
     def secrets(self):
         return self._secrets
 
+    @PROFILER.traced('torrserver', name='torrents list')
     def _get_torrents_list(self):
         resp = self._server_request(r_type='post', pref='torrents', data={'action': 'list'}, is_json=True)
         if resp.status_code == 200:
@@ -232,14 +1494,6 @@ class TorrServer(TorrentsSource):
             logging.warning('{}, {}'.format(resp.status_code, resp.reason))
             return dict()
 
-    def get_torrent_info(self, t_hash):
-        resp = self._server_request(r_type='post', pref='viewed', data={'action': 'list', 'hash': t_hash}, is_json=True)
-        if resp.status_code == 200:
-            return resp.json()
-        else:
-            logging.warning('{}, {}'.format(resp.status_code, resp.reason))
-            return dict()
-
     def remove_torrent(self, t_hash):
         resp = self._server_request(r_type='post', pref='torrents', data={'action': 'rem', 'hash': t_hash},
                                     is_json=True)
@@ -248,6 +1502,8 @@ class TorrServer(TorrentsSource):
     def add_torrent(self, torrent):
         data = {'action': 'add'} | torrent
         resp = self._server_request(r_type='post', pref='torrents', data=data, is_json=True)
+        if resp.status_code == 200:
+            METRICS.count('torrents_added_total')
         return resp
 
     def get_torrent(self, t_hash):
@@ -260,155 +1516,267 @@ class TorrServer(TorrentsSource):
         resp = self._server_request(r_type='post', pref='viewed', data=data, is_json=True)
         return resp
 
-    def _raw2struct(self):
-        for i in self._raw:
+    @PROFILER.traced('torrserver', name='viewed list')
+    def get_viewed_list(self):
+        """All viewed records of TorrServer with one request
+
+        :return: dict hash => set of viewed files indexes
+        """
+        resp = self._server_request(r_type='post', pref='viewed', data={'action': 'list'}, is_json=True)
+        viewed = dict()
+        if resp.status_code == 200:
+            for vi in resp.json() or list():
+                viewed.setdefault(vi.get('hash'), set()).add(vi.get('file_index'))
+        else:
+            logging.warning('{}, {}'.format(resp.status_code, resp.reason))
+        return viewed
+
+    def get_viewed_indexes(self, hashes):
+        """Viewed files indexes for all given hashes, from viewed list loaded once per run"""
+        with self._viewed_lock:
+            if self._viewed is None:
+                self._viewed = self.get_viewed_list()
+            indexes = set()
+            for t_hash in hashes:
+                indexes.update(self._viewed.get(t_hash, set()))
+        return indexes
+
+    def set_viewed_many(self, viewed):
+        """Mark files of many torrents as viewed, all requests are sent concurrently
+
+        :param viewed: dict hash => files indexes
+        :return: dict hash => number of files successfully marked
+        """
+        pairs = [(t_hash, idx) for t_hash, indexes in viewed.items() for idx in sorted(i for i in indexes
+                                                                                        if i is not None)]
+        if not pairs:
+            return dict()
+        with ThreadPoolExecutor(max_workers=min(len(pairs), self.host_limit)) as executor:
+            results = list(executor.map(lambda pair: self.set_viewed(viewed={'hash': pair[0], 'file_index': pair[1]}),
+                                        pairs))
+        done = dict()
+        with self._viewed_lock:
+            for (t_hash, idx), res in zip(pairs, results):
+                if res.status_code == 200:
+                    done[t_hash] = done.get(t_hash, 0) + 1
+                    if self._viewed is not None:
+                        self._viewed.setdefault(t_hash, set()).add(idx)
+        return done
+
+    @staticmethod
+    @PROFILER.traced('torrserver')
+    def _normalize(raw):
+        """Decode data field of every TorrServer entry once
+
+        :return: list of TorrServerRecord with TSA (srcUrl) and LITRCC (external_url) views
+        """
+        records = list()
+        for i in raw:
             t_hash = i.get('hash')
             if t_hash:
-                title = i.get('title')
-                poster = i.get('poster')
                 data = i.get('data')
                 try:
-                    data = json.loads(data)
-                    t_url = data.get('TSA', dict()).get('srcUrl')
-                except (JSONDecodeError, TypeError) as e:
+                    decoded = json.loads(data)
+                    if not isinstance(decoded, dict):
+                        decoded = dict()
+                    tsa_url = decoded.get('TSA', dict()).get('srcUrl')
+                    litrcc_url = decoded.get('LITRCC', dict()).get('external_url')
+                except (JSONDecodeError, TypeError, AttributeError) as e:
                     logging.warning(data)
                     logging.warning(e)
-                    t_url = data
-                timestamp = i.get('timestamp')
-                t_hash = i.get('hash')
-                stat = i.get('stat')
-                stat_string = i.get('stat_string')
-                torrent_size = i.get('torrent_size')
-                for tracker in TRACKERS:
-                    tracker_name_id, tracker_url_patterns = list(tracker.items())[0]
-                    _, sep = list(tracker.items())[1]
-                    torrent_id = TorrentsSource.is_tracker_link(url=t_url, patterns=tracker_url_patterns, sep=sep)
-                    if torrent_id:
-                        torrent = {'title': title, 'poster': poster, 't_url': t_url, 'timestamp': timestamp,
-                                   't_hash': t_hash, 'stat': stat, 'stat_string': stat_string,
-                                   'torrent_size': torrent_size, tracker_name_id: torrent_id}
-                        self.torrents_list.append(torrent)
-                        continue
+                    # data may be a plain link to tracker page
+                    tsa_url = data
+                    litrcc_url = None
+                records.append(TorrServerRecord(t_hash=t_hash, title=i.get('title'), poster=i.get('poster'),
+                                                timestamp=i.get('timestamp'), stat=i.get('stat'),
+                                                stat_string=i.get('stat_string'),
+                                                torrent_size=i.get('torrent_size'), tsa_url=tsa_url,
+                                                litrcc_url=litrcc_url))
+        return records
+
+    @staticmethod
+    def _record2torrent(record, t_url):
+        return {'title': record.title, 'poster': record.poster, 't_url': t_url, 'timestamp': record.timestamp,
+                't_hash': record.t_hash, 'stat': record.stat, 'stat_string': record.stat_string,
+                'torrent_size': record.torrent_size}
+
+    @PROFILER.traced('torrserver')
+    def _raw2struct(self):
+        for record in self.records:
+            tracker = TorrentsSource.get_tracker_by_url(url=record.tsa_url)
+            if tracker:
+                tracker_name_id, sep = tracker
+                torrent_id = TorrentsSource.get_torrent_id(url=record.tsa_url, sep=sep)
+                if torrent_id:
+                    torrent = self._record2torrent(record=record, t_url=record.tsa_url)
+                    torrent[tracker_name_id] = torrent_id
+                    self.torrents_list.append(torrent)
         logging.info(f'Torrserver, torrents got: {len(self.torrents_list)}')
 
     def get_litrcc_torrents(self):
-        for i in self._raw:
-            t_hash = i.get('hash')
-            if t_hash:
-                title = i.get('title')
-                poster = i.get('poster')
-                data = i.get('data')
-                try:
-                    data = json.loads(data)
-                    t_url = data.get('LITRCC', dict()).get('external_url')
-                except (JSONDecodeError, TypeError) as e:
-                    logging.warning(data)
-                    logging.warning(e)
-                    t_url = None
-                timestamp = i.get('timestamp')
-                t_hash = i.get('hash')
-                stat = i.get('stat')
-                stat_string = i.get('stat_string')
-                torrent_size = i.get('torrent_size')
-                if t_url:
-                    torrent = {'title': title, 'poster': poster, 't_url': t_url, 'timestamp': timestamp,
-                               't_hash': t_hash, 'stat': stat, 'stat_string': stat_string,
-                               'torrent_size': torrent_size}
-                    self.litrcc_torrents_list.append(torrent)
-                    self.litrcc_torrents_cache.append(t_url)
+        self.litrcc_torrents_list = list()
+        self.litrcc_torrents_index = dict()
+        for record in self.records:
+            if record.litrcc_url:
+                torrent = self._record2torrent(record=record, t_url=record.litrcc_url)
+                self.litrcc_torrents_list.append(torrent)
+                self.litrcc_torrents_index.setdefault(record.litrcc_url, list()).append(torrent)
         logging.info(f'Torrserver, litr.cc torrents got: {len(self.litrcc_torrents_list)}')
 
-    def add_updated_torrent(self, updated_torrent, viewed_episodes):
-        res = self.add_torrent(torrent=updated_torrent)
-        title = updated_torrent.get('title')
-        t_hash = updated_torrent.get('hash')
-        if res.status_code == 200:
-            logging.info(f'{title} => added/updated')
-        for idx in viewed_episodes:
-            viewed = {'hash': t_hash, 'file_index': idx}
-            res = self.set_viewed(viewed=viewed)
-            if res.status_code == 200:
-                logging.info(f'{idx} episode => set as viewed')
-        res = self.get_torrent(t_hash=t_hash)
-        return res.status_code
-
     def get_torrent_stat(self, t_hash):
         resp = self._server_request(r_type='get', pref=f'stream/fname?link={t_hash}&stat')
         return resp
 
-    def delete_torrent_with_check(self, t_hash):
-        res = self.remove_torrent(t_hash=t_hash)
-        res2 = self.get_torrent(t_hash=t_hash)
-        if (res.status_code == 200) and (res2.status_code == 404):
-            logging.info(f'Old torrent with hash: {t_hash} => deleted successfully')
+    def delete_torrents(self, hashes):
+        """Delete torrents concurrently and check deletion
+
+        Few torrents are checked one by one, many torrents are checked with one list request.
+        """
+        hashes = list(dict.fromkeys(hashes))
+        if not hashes:
+            return
+        with ThreadPoolExecutor(max_workers=min(len(hashes), self.host_limit)) as executor:
+            removed = list(executor.map(lambda t_hash: self.remove_torrent(t_hash=t_hash), hashes))
+        if len(hashes) >= self.batch_check_size:
+            resp = self._server_request(r_type='post', pref='torrents', data={'action': 'list'}, is_json=True)
+            if resp.status_code == 200:
+                remaining = {i.get('hash') for i in resp.json() or list()}
+                deleted = [t_hash not in remaining for t_hash in hashes]
+            else:
+                logging.warning(f'Torrents list not available, {resp.status_code}, {resp.reason}')
+                deleted = [False] * len(hashes)
         else:
-            logging.warning(f'Old torrent with hash: {t_hash} => deletion problems')
-
-    def cleanup_torrents(self, hashes=None, perm=False):
-        if hashes is None:
-            hashes = list()
-        if perm:
-            logging.warning(f'Permanent cleanup mode!!! Will be deleted torrents duplicates.')
-
-            tracker_name_id, tracker_url_patterns = list(RUTOR.items())[0]
-            rutor_torrents = self.get_tracker_torrents(tracker_id=tracker_name_id)
-            logging.info(f'{len(rutor_torrents)} torrents from {tracker_url_patterns} found.')
-            duplicated = 0
-            for rutor_id, torrents_lst in rutor_torrents.items():
+            with ThreadPoolExecutor(max_workers=min(len(hashes), self.host_limit)) as executor:
+                deleted = list(executor.map(lambda t_hash: self.get_torrent(t_hash=t_hash).status_code == 404,
+                                            hashes))
+        for t_hash, res, is_deleted in zip(hashes, removed, deleted):
+            if (res.status_code == 200) and is_deleted:
+                logging.info(f'Old torrent with hash: {t_hash} => deleted successfully')
+                METRICS.count('torrents_cleaned_total')
+            else:
+                logging.warning(f'Old torrent with hash: {t_hash} => deletion problems')
+
+    def get_torrents_stats(self, hashes):
+        """Stat of torrents requested concurrently
+
+        :return: dict hash => stat json, torrents with stat errors are missed
+        """
+        hashes = list(dict.fromkeys(hashes))
+        stats = dict()
+        if not hashes:
+            return stats
+        with ThreadPoolExecutor(max_workers=min(len(hashes), self.host_limit)) as executor:
+            responses = list(executor.map(lambda t_hash: self.get_torrent_stat(t_hash=t_hash), hashes))
+        for t_hash, stat_resp in zip(hashes, responses):
+            if stat_resp.status_code == 200:
+                stat_json = stat_resp.json()
+                if stat_json:
+                    stats[t_hash] = stat_json
+            else:
+                logging.error(f'Error getting info about torrent file list, STATUS_CODE={stat_resp.status_code}')
+        return stats
+
+    def get_duplicates(self):
+        """Groups of torrents with the same tracker topic id or the same litr.cc external_url
+
+        :return: list of (group name, torrents list)
+        """
+        groups = list()
+        for tracker in TRACKERS:
+            tracker_name_id, tracker_url_patterns = list(tracker.items())[0]
+            tracker_torrents = self.get_tracker_torrents(tracker_id=tracker_name_id)
+            logging.info(f'{len(tracker_torrents)} torrents from {tracker_url_patterns} found.')
+            for torrent_id, torrents_lst in tracker_torrents.items():
                 if len(torrents_lst) > 1:
-                    duplicated += 1
-                    logging.info(f'ID: {rutor_id}, {len(torrents_lst)} copies found.')
-                    doubles = list()
-                    for torrent in torrents_lst:
-                        logging.debug(torrent)
-                        t_hash = torrent.get('t_hash')
-                        stat_resp = self.get_torrent_stat(t_hash=t_hash)
-                        if stat_resp.status_code == 200:
-                            stat_json = stat_resp.json()
-                            if stat_json:
-                                title = stat_json.get('title')
-                                file_stats = stat_json.get('file_stats', list())
-                                logging.info(f'{title} ==> {len(file_stats)} series.')
-                                doubles.append({'hash': t_hash, 'title': title, 'file_stats': file_stats})
-                        else:
-                            logging.error(
-                                f'Error getting info about torrent file list, STATUS_CODE={stat_resp.status_code}')
-                    logging.info(f'Will search newest one.')
-                    doubles = sorted(doubles, key=lambda d: len(d['file_stats']), reverse=True)
-                    while len(doubles) > 1:
-                        deletion_candidate = doubles.pop(-1)
-                        logging.debug(deletion_candidate)
-                        self.delete_torrent_with_check(t_hash=deletion_candidate.get('hash'))
-            if not duplicated:
-                logging.info(f'There are no duplicates found. Have a nice day!')
-        else:
-            for hash_to_remove in hashes:
-                self.delete_torrent_with_check(t_hash=hash_to_remove)
+                    groups.append((f'{tracker_name_id}: {torrent_id}', torrents_lst))
+        self.get_litrcc_torrents()
+        for external_url, torrents_lst in self.litrcc_torrents_index.items():
+            if len(torrents_lst) > 1:
+                groups.append((f'litr.cc: {external_url}', torrents_lst))
+        return groups
+
+    @PROFILER.traced('apply')
+    def apply_plan(self, plan):
+        """Execute update plan: add new torrents, copy viewed marks, delete old torrents
+
+        Each step is one batch of concurrent requests. Old torrents of update are deleted
+        only if its new torrent is added, so nothing is lost if TorrServer rejects the new one.
+
+        :return: number of added torrents
+        """
+        with self.lock:
+            updates = plan.updates
+            added = list()
+            if updates:
+                with ThreadPoolExecutor(max_workers=min(len(updates), self.host_limit)) as executor:
+                    responses = list(executor.map(lambda update: self.add_torrent(torrent=update.torrent), updates))
+                for update, res in zip(updates, responses):
+                    if res.status_code == 200:
+                        logging.info(f'{update.torrent.get("title")} => added/updated')
+                        added.append(update)
+                    else:
+                        logging.warning(f'{update.torrent.get("title")} => not added, {res.status_code}, '
+                                        f'old torrents are kept')
+            viewed = {update.torrent.get('hash'): update.viewed for update in added if update.viewed}
+            if viewed:
+                done = self.set_viewed_many(viewed=viewed)
+                logging.info(f'{sum(done.values())} of {sum(len(v) for v in viewed.values())} episodes of '
+                             f'{len(viewed)} torrents => set as viewed')
+            new_hashes = {update.torrent.get('hash') for update in updates}
+            to_delete = [t_hash for update in added for t_hash in update.old_hashes] + list(plan.removals)
+            with PROFILER.span('delete_torrents', 'cleanup'):
+                self.delete_torrents(hashes=[t_hash for t_hash in to_delete if t_hash not in new_hashes])
+            return len(added)
+
+    def get_cleanup_hashes(self):
+        """Duplicates to delete: of torrents with the same topic all but one with the most files
+
+        :return: list of hashes
+        """
+        groups = self.get_duplicates()
+        stats = self.get_torrents_stats(hashes=[t.get('t_hash') for _, lst in groups for t in lst])
+        to_delete = list()
+        for group_name, torrents_lst in groups:
+            logging.info(f'ID: {group_name}, {len(torrents_lst)} copies found.')
+            doubles = list()
+            for torrent in torrents_lst:
+                logging.debug(torrent)
+                t_hash = torrent.get('t_hash')
+                stat_json = stats.get(t_hash)
+                if stat_json:
+                    title = stat_json.get('title')
+                    file_stats = stat_json.get('file_stats', list())
+                    logging.info(f'{title} ==> {len(file_stats)} series.')
+                    doubles.append({'hash': t_hash, 'title': title, 'file_stats': file_stats})
+            doubles = sorted(doubles, key=lambda d: len(d['file_stats']), reverse=True)
+            for deletion_candidate in doubles[1:]:
+                logging.debug(deletion_candidate)
+                to_delete.append(deletion_candidate.get('hash'))
+        if not groups:
+            logging.info(f'There are no duplicates found. Have a nice day!')
+        return to_delete
 
 
 class RuTor(TorrentsSource):
-    def __init__(self, *args, **kwargs):
-        super().__init__(*args, **kwargs)
-        self._url_pattern = 'http://rutor.info/torrent/'
 
-    @staticmethod
-    def get_magnet(text, xpath='//div[@id="download"]/a/@href'):
-        return TorrentsSource.get_magnet(text=text, xpath=xpath)
+    magnet_xpath = '//div[@id="download"]/a/@href'
+    streaming = True
+    mirrors = tuple(RUTOR['rutor_id'])
+    url_template = 'http://{mirror}/torrent/'
+    _title_pattern = re.compile(r'<h1>(.*?)</h1>')
+    _poster_pattern = re.compile(r'<br /><img src=[\'"]?([^\'" >]+)')
 
-    @staticmethod
-    def get_title(text):
-        pattern = re.compile(r'<h1>(.*?)</h1>')
-        fixed_html = text.replace('\n', '')
-        search_res = pattern.search(fixed_html)
+    @classmethod
+    def get_title(cls, page):
+        search_res = cls._title_pattern.search(TrackerPage.wrap(page).stripped('\n'))
         if search_res:
             return search_res.group(1)
         else:
             return None
 
-    @staticmethod
-    def get_poster(text):
-        fixed_html = text.replace('\n', '').replace('\r', '').replace('\t', '')
-        match = re.search(r'<br /><img src=[\'"]?([^\'" >]+)', fixed_html)
+    @classmethod
+    def get_poster(cls, page):
+        match = cls._poster_pattern.search(TrackerPage.wrap(page).stripped('\n\r\t'))
         if match:
             return match.group(1)
         else:
@@ -419,6 +1787,8 @@ class LitrCC(TorrentsSource):
     def __init__(self, url, *args, **kwargs):
         super().__init__(*args, **kwargs)
         self._server_url = URL(url)
+        # external_url => the latest feed item with this url
+        self.torrents_index: dict = dict()
         self._raw = self._get_torrents_list()
         self._raw2struct()
 
@@ -439,8 +1809,17 @@ class LitrCC(TorrentsSource):
         # ToDO: save last valid token for next auth (refresh)
         pass
 
+    @staticmethod
+    def _parse_date(torrent):
+        try:
+            return datetime.fromisoformat(torrent.get('date_modified'))
+        except (TypeError, ValueError):
+            logging.warning(f'litr.cc item {torrent.get("id")}: bad date_modified {torrent.get("date_modified")}')
+            return None
+
     def _raw2struct(self):
-        filtered_data = dict()
+        filtered_data = self.torrents_index
+        dates = dict()
         for i in self._raw.get('items', list()):
             t_id = i.get('id')
             if t_id:
@@ -451,16 +1830,20 @@ class LitrCC(TorrentsSource):
                 external_url = i.get('external_url')
                 torrent = {'id': str(t_id).lower(), 'title': title, 'url': url, 'date_modified': date_modified,
                            'image': image, 'external_url': external_url}
-                old = filtered_data.get(external_url)
                 if external_url:
-                    if old:
-                        old_date_modified = old.get('date_modified')
-                        old_date_modified_iso = datetime.fromisoformat(old_date_modified)
-                        date_modified_iso = datetime.fromisoformat(date_modified)
-                        if old_date_modified_iso < date_modified_iso:
-                            filtered_data[external_url] = torrent
-                    else:
+                    old = filtered_data.get(external_url)
+                    if old is None:
                         filtered_data[external_url] = torrent
+                        continue
+                    # dates are parsed only to choose between items with the same url
+                    if external_url not in dates:
+                        dates[external_url] = self._parse_date(old)
+                    date_modified_iso = self._parse_date(torrent)
+                    old_date_modified_iso = dates.get(external_url)
+                    if (date_modified_iso is not None) and ((old_date_modified_iso is None)
+                                                            or (old_date_modified_iso < date_modified_iso)):
+                        filtered_data[external_url] = torrent
+                        dates[external_url] = date_modified_iso
         for _, v in filtered_data.items():
             self.torrents_list.append(v)
         logging.info(f'litr.cc RSS-feed, torrents got: {len(self.torrents_list)}')
@@ -474,6 +1857,7 @@ class Config:
         self.load_config()
 
     def load_config(self):
+        import yaml
         with open(self._filename, 'r') as f:
             try:
                 self.config = yaml.load(f, Loader=yaml.FullLoader)
@@ -496,28 +1880,27 @@ class Config:
 
 
 class NnmClub(TorrentsSource):
+
+    magnet_xpath = '//td/a/@href'
+    streaming = True
+    _title_pattern = re.compile(r'<a class=\"maintitle\" href="viewtopic.php\?t=([0-9]*)\">(.*?)</a>')
+    _poster_pattern = re.compile(r'<meta property=\"og:image" content=[\'"]?([^\'" >]+)')
+
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
         self._url_pattern = 'https://nnmclub.to/forum/viewtopic.php?t='
 
-    @staticmethod
-    def get_magnet(text, xpath='//td/a/@href'):
-        return TorrentsSource.get_magnet(text=text, xpath=xpath)
-
-    @staticmethod
-    def get_title(text):
-        pattern = re.compile(r'<a class=\"maintitle\" href="viewtopic.php\?t=([0-9]*)\">(.*?)</a>')
-        fixed_html = text.replace('\n', '')
-        search_res = pattern.search(fixed_html)
+    @classmethod
+    def get_title(cls, page):
+        search_res = cls._title_pattern.search(TrackerPage.wrap(page).stripped('\n'))
         if search_res:
             return search_res.group(2)
         else:
             return None
 
-    @staticmethod
-    def get_poster(text):
-        fixed_html = text.replace('\n', '').replace('\r', '').replace('\t', '')
-        match = re.search(r'<meta property=\"og:image" content=[\'"]?([^\'" >]+)', fixed_html)
+    @classmethod
+    def get_poster(cls, page):
+        match = cls._poster_pattern.search(TrackerPage.wrap(page).stripped('\n\r\t'))
         if match:
             return match.group(1)
         else:
@@ -525,64 +1908,99 @@ class NnmClub(TorrentsSource):
 
 
 class TorrentBy(RuTor):
+
+    magnet_xpath = NnmClub.magnet_xpath
+    mirrors = ()
+
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
         self._url_pattern = 'https://torrent.by/'
 
     # if you have problems with error ssl certificate torrent.by, pass verify=False to disable verify ssl certificate
-    def get_torrent_page(self, torrent_id):
-        self._server_url = f'{self._url_pattern}{torrent_id}'
-        logging.debug(f'URL: {self._server_url}')
-        resp = self._server_request(r_type='get', verify=False)
+    def get_torrent_page(self, torrent_id, headers=None, stream=False):
+        url = self.get_topic_url(torrent_id=torrent_id)
+        logging.debug(f'URL: {url}')
+        resp = self._server_request(r_type='get', url=url, headers=headers, verify=False, stream=stream)
         return resp
 
-    @staticmethod
-    def get_magnet(text, xpath=''):
-        return NnmClub.get_magnet(text=text)
-
 
 class Rutracker(TorrentsSource):
+
+    rate_limit = 1
+    rate_burst = 3
+    magnet_xpath = '//table//a[@class="magnet-link"]/@href'
+    streaming = True
+    title_xpath = '//h1[@class="maintitle"]/a[@id="topic-title"]//text()'
+    poster_xpath = '//var[contains(@class, "postImg postImgAligned")]/@title'
+
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
         self._url_pattern = 'https://rutracker.org/forum/viewtopic.php?t='
 
-    @staticmethod
-    def get_magnet(text, xpath='//table//a[@class="magnet-link"]/@href'):
-        return TorrentsSource.get_magnet(text=text, xpath=xpath)
-
-    @staticmethod
-    def get_title(text):
-        h1_main_title = html.fromstring(text).xpath('//h1[@class="maintitle"]/a[@id="topic-title"]//text()')
+    @classmethod
+    def get_title(cls, page):
+        h1_main_title = TrackerPage.wrap(page).xpath(cls.title_xpath)
         if h1_main_title:
             h1_main_title_text = ''.join(h1_main_title)
             return h1_main_title_text
         else:
             return None
 
-    @staticmethod
-    def get_poster(text):
-        img_src = html.fromstring(text).xpath('//var[contains(@class, "postImg postImgAligned")]/@title')
-        if img_src:
-            return img_src[0]
-        else:
-            return None
-
 
 class Updater(TorrentsSource):
+    releases_ttl = 24 * 3600
+    check_timeout = 5
 
     def __init__(self, *args, **kwargs):
         # self._secrets = self.load_secrets()
         super().__init__(*args, **kwargs)
         self.schedule = kwargs.get('schedule', -1)
         self._server_url = 'https://api.github.com'
+        self._cache_file = None
+        if kwargs.get('cache_dir'):
+            self._cache_file = os.path.join(kwargs.get('cache_dir'), 'latest_release.json')
+        self.releases_ttl = kwargs.get('releases_ttl', self.releases_ttl)
+        self._check_thread = None
+
+    def _load_cached_releases(self):
+        """Last github answer, if it is not older than releases_ttl"""
+        if not self._cache_file:
+            return None
+        try:
+            if time.time() - os.path.getmtime(self._cache_file) > self.releases_ttl:
+                return None
+            with open(self._cache_file, mode='r', encoding='utf-8') as cache_file:
+                return json.load(cache_file)
+        except (OSError, ValueError):
+            return None
 
-    def _get_latest_releases(self):
-        resp = self._server_request(r_type='get', pref='repos/Mantikor/TorrserverSeriesUpdater/releases/latest')
+    def _save_cached_releases(self, releases):
+        if not self._cache_file:
+            return
+        try:
+            os.makedirs(os.path.dirname(self._cache_file), exist_ok=True)
+            tmp_path = f'{self._cache_file}.{threading.get_ident()}.tmp'
+            with open(tmp_path, mode='w', encoding='utf-8') as cache_file:
+                json.dump(releases, cache_file, ensure_ascii=False)
+            os.replace(tmp_path, self._cache_file)
+        except OSError as e:
+            logging.warning(f'Releases cache: {e}')
+
+    def _get_latest_releases(self, use_cache=True):
+        releases = self._load_cached_releases() if use_cache else None
+        if releases is not None:
+            logging.debug(f'Latest release loaded from cache: {self._cache_file}')
+            return releases
+        resp = self._server_request(r_type='get', pref='repos/Mantikor/TorrserverSeriesUpdater/releases/latest',
+                                    timeout=self.check_timeout)
         if resp.status_code == 200:
-            return resp.json()
+            releases = resp.json()
         else:
             logging.warning('{}, {}'.format(resp.status_code, resp.reason))
-            return dict()
+            releases = dict()
+        # failed check is cached too, unreachable github is not asked again until ttl expires
+        self._save_cached_releases(releases)
+        return releases
 
     @staticmethod
     def is_there_new_version(remote_v, local_v=__version__):
@@ -604,8 +2022,8 @@ class Updater(TorrentsSource):
                 return True
         return False
 
-    def check_updates(self, only_new=True):
-        releases = self._get_latest_releases()
+    def check_updates(self, only_new=True, use_cache=True):
+        releases = self._get_latest_releases(use_cache=use_cache)
         if releases:
             ver = releases.get('tag_name')
             comment = releases.get('name')
@@ -621,38 +2039,152 @@ class Updater(TorrentsSource):
                     download_url = asset.get('browser_download_url')
                     logging.info(f'{download_url}')
 
-    def check_scheduled_updates(self, schedule):
+    def check_scheduled_updates(self, schedule, background=True):
         dt = datetime.now()
         today = dt.isoweekday()
         if schedule == today:
-            self.check_updates()
+            if background:
+                self._check_thread = threading.Thread(target=self.check_updates, name='updater', daemon=True)
+                self._check_thread.start()
+            else:
+                self.check_updates()
+
+    def wait(self, timeout=None):
+        """Wait for background check of updates, started by check_scheduled_updates"""
+        if self._check_thread:
+            self._check_thread.join(timeout)
+
+
+def bencode_string_span(data, pos):
+    """Start and end of bencoded string <length>:<bytes> at pos, length must be plain ascii digits"""
+    colon = data.index(b':', pos)
+    length = bytes(data[pos:colon])
+    if not (length.isdigit() and length.isascii()):
+        raise ValueError(f'Bad bencoded string length at {pos}')
+    end = colon + 1 + int(length)
+    if end > len(data):
+        raise ValueError('Bencoded string is out of data')
+    return colon + 1, end
+
+
+def bencode_end(data, pos=0):
+    """Position right after bencoded value starting at pos, value is skipped without decoding"""
+    depth = 0
+    index = data.index
+    while True:
+        token = data[pos]
+        if token == 0x69:  # i<number>e
+            pos = index(b'e', pos) + 1
+        elif token == 0x64 or token == 0x6c:  # d... or l... until e
+            depth += 1
+            pos += 1
+            continue
+        elif token == 0x65:
+            depth -= 1
+            pos += 1
+        else:  # <length>:<bytes>
+            _, pos = bencode_string_span(data, pos)
+        if depth == 0:
+            return pos
+        if depth < 0:
+            raise ValueError(f'Unexpected end of bencoded value at {pos - 1}')
+
+
+def bencode_dict_spans(data, pos=0, nested=None):
+    """Spans of values of bencoded dict starting at pos, in one pass
+
+    :param nested: key of dict value, which values spans are collected in the same pass
+    :return: spans: key => (start, end) of value in data, spans of nested dict, position right after dict
+    """
+    if data[pos] != 0x64:
+        raise ValueError(f'Bencoded dict expected at {pos}')
+    pos += 1
+    spans = dict()
+    nested_spans = dict()
+    while data[pos] != 0x65:
+        key_start, key_end = bencode_string_span(data, pos)
+        key = bytes(data[key_start:key_end])
+        if (key == nested) and (data[key_end] == 0x64):
+            nested_spans, _, value_end = bencode_dict_spans(data, key_end)
+        else:
+            value_end = bencode_end(data, key_end)
+        spans[key] = (key_end, value_end)
+        pos = value_end
+    return spans, nested_spans, pos + 1
+
+
+def bencode_decode(data, pos=0):
+    """Decode bencoded value starting at pos
+
+    :return: value and position right after it
+    """
+    token = data[pos]
+    if token == 0x69:
+        end = data.index(b'e', pos)
+        return int(data[pos + 1:end]), end + 1
+    if token == 0x6c:
+        pos += 1
+        result = list()
+        while data[pos] != 0x65:
+            value, pos = bencode_decode(data, pos)
+            result.append(value)
+        return result, pos + 1
+    if token == 0x64:
+        pos += 1
+        result = dict()
+        while data[pos] != 0x65:
+            key, pos = bencode_decode(data, pos)
+            result[key], pos = bencode_decode(data, pos)
+        return result, pos + 1
+    start, end = bencode_string_span(data, pos)
+    return bytes(data[start:end]), end
 
 
 class TorrentFile(object):
+    """.torrent file metadata
+
+    File is scanned once for spans of top level and info values, infohash is sha1 of original info bytes,
+    other values are decoded only when requested.
+    """
+
     def __init__(self, file_content):
-        self.content = file_content
+        self.content = bytes(file_content or b'')
+        self._spans = dict()
+        self._info_spans = dict()
+        self._metadata = None
         try:
-            self.metadata = bencodepy.decode(self.content)
-        except Exception as e:
-            if logging.getLogger().handlers[0].level == logging.DEBUG:
+            self._spans, self._info_spans, _ = bencode_dict_spans(self.content, nested=b'info')
+        except (ValueError, IndexError) as e:
+            if logging.getLogger().handlers and logging.getLogger().handlers[0].level == logging.DEBUG:
                 logging.error(e)
-            self.metadata = dict()
+            self._spans = dict()
+            self._info_spans = dict()
+
+    @property
+    def metadata(self):
+        """Whole decoded file, avoid for big files"""
+        if self._metadata is None:
+            self._metadata = bencode_decode(self.content)[0] if self._spans else dict()
+        return self._metadata
+
+    def _decode(self, spans, key):
+        span = spans.get(key)
+        if span is None:
+            return None
+        return bencode_decode(self.content, span[0])[0]
 
     def get_hash(self):
         hex_digest = None
-        try:
-            subj = self.metadata.get(b'info')
-            if subj:
-                hash_contents = bencodepy.encode(subj)
-                hex_digest = hashlib.sha1(hash_contents).hexdigest()
-        except Exception as e:
-            logging.error(e)
+        span = self._spans.get(b'info')
+        if span:
+            with memoryview(self.content) as content:
+                hex_digest = hashlib.sha1(content[span[0]:span[1]]).hexdigest()
         return hex_digest
 
     def get_name(self):
         name = None
         try:
-            b_name = self.metadata.get(b'info', dict()).get(b'name')
+            b_name = self._decode(self._info_spans, b'name')
             if b_name:
                 name = b_name.decode('utf-8')
         except Exception as e:
@@ -660,12 +2192,29 @@ class TorrentFile(object):
         return name
 
     def get_files_list(self):
-        pass
+        """Files of torrent
+
+        :return: list of dicts with path (relative, with "/" separator) and length
+        """
+        files = list()
+        try:
+            b_files = self._decode(self._info_spans, b'files')
+            if b_files is None:
+                name = self.get_name()
+                if name:
+                    files.append({'path': name, 'length': self._decode(self._info_spans, b'length')})
+            else:
+                for b_file in b_files:
+                    path = '/'.join(part.decode('utf-8', errors='replace') for part in b_file.get(b'path', list()))
+                    files.append({'path': path, 'length': b_file.get(b'length')})
+        except Exception as e:
+            logging.error(e)
+        return files
 
     def get_announce(self):
         announce = None
         try:
-            b_announce = self.metadata.get(b'announce')
+            b_announce = self._decode(self._spans, b'announce')
             if b_announce:
                 announce = b_announce.decode('utf-8')
         except Exception as e:
@@ -673,110 +2222,236 @@ class TorrentFile(object):
         return announce
 
 
+class TorrentFileCache(object):
+    """On-disk cache of .torrent files
+
+    Files are stored by infohash, so one file linked from several pages is kept once.
+    Json entry per link keeps infohash, name and announce of the file and its ETag/Last-Modified,
+    so the file is neither downloaded nor decoded again to compare its name.
+    Entries and files not used for max_age are removed on start.
+    """
+
+    max_age = 90 * 24 * 3600
+
+    def __init__(self, path):
+        self._path = path
+        os.makedirs(self._path, exist_ok=True)
+        self._remove_old()
+
+    def _entry_path(self, url):
+        return os.path.join(self._path, f'{hashlib.sha1(str(url).encode("utf-8")).hexdigest()}.json')
+
+    def _file_path(self, t_hash):
+        return os.path.join(self._path, f'{t_hash}.torrent')
+
+    @staticmethod
+    def _write(path, data, mode='w'):
+        tmp_path = f'{path}.{threading.get_ident()}.tmp'
+        with open(tmp_path, mode=mode, encoding=None if 'b' in mode else 'utf-8') as tmp_file:
+            if 'b' in mode:
+                tmp_file.write(data)
+            else:
+                json.dump(data, tmp_file, ensure_ascii=False)
+        os.replace(tmp_path, path)
+
+    def get(self, url):
+        entry_path = self._entry_path(url)
+        try:
+            with open(entry_path, mode='r', encoding='utf-8') as entry_file:
+                entry = json.load(entry_file)
+            os.utime(entry_path)
+            if os.path.isfile(self._file_path(entry.get('hash'))):
+                os.utime(self._file_path(entry.get('hash')))
+        except (OSError, ValueError):
+            return None
+        if entry.get('url') != str(url):
+            return None
+        return entry
+
+    def get_file(self, t_hash):
+        try:
+            with open(self._file_path(t_hash), mode='rb') as torrent_file:
+                return torrent_file.read()
+        except OSError:
+            return None
+
+    def put(self, url, entry, content=None):
+        entry = entry | {'url': str(url), 'checked': time.time()}
+        try:
+            if content and not os.path.isfile(self._file_path(entry.get('hash'))):
+                self._write(self._file_path(entry.get('hash')), content, mode='wb')
+            self._write(self._entry_path(url), entry)
+        except OSError as e:
+            logging.warning(f'Torrent files cache: {e}')
+        return entry
+
+    def _remove_old(self):
+        expired = time.time() - self.max_age
+        for entry in os.scandir(self._path):
+            try:
+                if entry.stat().st_mtime < expired:
+                    os.remove(entry.path)
+            except OSError:
+                pass
+
+
 class AniDub(TorrentsSource):
+
+    # magnet is taken from .torrent file, which may be changed without page changes
+    cacheable = False
+    file_links_xpath = '//div[@class="torrent"]//div[@class="torrent_h"]/a/@href'
+    title_xpath = '//h1//text()'
+    poster_xpath = '//div[contains(@class, "poster_bg")]//img/@src'
+    # .torrent files downloaded in parallel for one page
+    file_workers = 4
+    # cached name and hash of .torrent file are used without any request during file_ttl, seconds
+    file_ttl = 0
+
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
         self._url_pattern = ''
         self.name_from_torrent_file = ''
         self.torrent_file_link = ''
-        self._file_links_xpath = '//div[@class="torrent"]//div[@class="torrent_h"]/a/@href'
-
-    def get_torrent_page(self, torrent_id):
-        self._server_url = torrent_id
-        self.name_from_torrent_file = ''
-        self.torrent_file_link = ''
-        logging.debug(f'URL: {self._server_url}')
-        resp = self._server_request(r_type='get')
+        self._file_cache = None
+        if kwargs.get('cache_dir'):
+            try:
+                self._file_cache = TorrentFileCache(path=os.path.join(kwargs.get('cache_dir'), 'torrents'))
+            except OSError as e:
+                logging.warning(f'Torrent files cache: {e}, files are not cached')
+        self.file_ttl = kwargs.get('file_ttl') or self.file_ttl
+
+    def get_topic_url(self, torrent_id):
+        # torrent_id for anime trackers is the page link itself
+        return torrent_id
+
+    def get_torrent_page(self, torrent_id, headers=None):
+        url = self.get_topic_url(torrent_id=torrent_id)
+        logging.debug(f'URL: {url}')
+        resp = self._server_request(r_type='get', url=url, headers=headers)
         return resp
 
-    def get_magnet_from_file(self, text):
+    def _is_fresh(self, entry):
+        return bool(entry) and (time.time() - entry.get('checked', 0) < self.file_ttl)
+
+    def get_torrent_file_info(self, url):
+        """Name, hash and announce of .torrent file by link, from cache if file not changed
+
+        :return: dict with hash, name and announce or None if file not available
+        """
+        entry = self._file_cache.get(url) if self._file_cache else None
+        if self._is_fresh(entry):
+            return entry
+        resp = self.server_request(url=url, headers=PageCache.validators(entry))
+        if resp and (resp.status_code == 304) and entry:
+            logging.debug(f'Torrent file {url} => not modified')
+            return self._file_cache.put(url=url, entry=entry)
+        if not (resp and (resp.status_code == 200)):
+            return None
+        tf = TorrentFile(file_content=resp.content)
+        entry = {'hash': tf.get_hash(), 'name': tf.get_name(), 'announce': tf.get_announce(),
+                 'etag': resp.headers.get('ETag'), 'last_modified': resp.headers.get('Last-Modified')}
+        if self._file_cache and entry.get('hash'):
+            entry = self._file_cache.put(url=url, entry=entry, content=resp.content)
+        return entry
+
+    def _magnet_from_file_info(self, f_link, entry):
+        self.torrent_file_link = f_link
+        file_hash = entry.get('hash')
+        logging.debug(f'Torrent hash from file: {file_hash}')
+        file_announce = entry.get('announce')
+        logging.debug(f'Torrent announce server from file: {file_announce}')
+        if not file_announce:
+            return f'magnet:?xt=urn:btih:{file_hash}'
+        url_encoded_announce = urllib.parse.quote(file_announce, safe='')
+        return f'magnet:?xt=urn:btih:{file_hash}&tr={url_encoded_announce}'
+
+    def get_magnet_from_file(self, page, name=None):
         """Get magnet from .torrent files links of html page
-        Get all links to .torrent files on page (from text), download .torrent file,
+        Get all links to .torrent files on page, download .torrent files in parallel,
         get metadata from file, from metadata get torrent name (metadata[b'info'][b'name']),
-        if name == torrent_name get hash from .torrent file
+        if name == torrent_name get hash from .torrent file, other downloads are cancelled.
+        Files already in cache and checked less than file_ttl ago are not requested at all.
 
+        :param page: TrackerPage or page text, page url is used to make .torrent links absolute
+        :param name: torrent name to search for, by default name_from_torrent_file
         :return: file_hash:
         """
-        page = html.fromstring(text)
-        page.make_links_absolute(self._server_url)
-        file_links = page.xpath(self._file_links_xpath)
-        if file_links:
-            file_links = set(file_links)
+        page = TrackerPage.wrap(page, url=self._server_url)
+        if name is None:
+            name = self.name_from_torrent_file
+        file_links = page.xpath(self.file_links_xpath)
+        if not file_links:
+            return None
+        file_links = list(dict.fromkeys(urllib.parse.urljoin(str(page.url or ''), str(link)) for link in file_links))
+        logging.debug(f'Given torrent name: {name}')
+        if self._file_cache:
             for f_link in file_links:
-                logging.debug(f'Link: {f_link}')
-                torrent_file = self.server_request(url=f_link)
-                if torrent_file and (torrent_file.status_code == 200):
-                    tf = TorrentFile(file_content=torrent_file.content)
-                    file_torrent_name = tf.get_name()
-                    logging.debug(f'File  torrent name: {file_torrent_name}')
-                    logging.debug(f'Given torrent name: {file_torrent_name}')
-                    if file_torrent_name == self.name_from_torrent_file:
-                        self.torrent_file_link = f_link
-                        file_hash = tf.get_hash()
-                        logging.debug(f'Torrent hash from downloaded file: {file_hash}')
-                        file_announce = tf.get_announce()
-                        logging.debug(f'Torrent announce server from downloaded file: {file_announce}')
-                        url_encoded_announce = urllib.parse.quote(file_announce, safe='')
-                        magnet_link = f'magnet:?xt=urn:btih:{file_hash}&tr={url_encoded_announce}'
-                        return magnet_link
+                entry = self._file_cache.get(f_link)
+                if self._is_fresh(entry) and (entry.get('name') == name):
+                    logging.debug(f'Link: {f_link} => cached torrent name matched')
+                    return self._magnet_from_file_info(f_link=f_link, entry=entry)
+        executor = ThreadPoolExecutor(max_workers=min(self.file_workers, len(file_links)))
+        try:
+            futures = {executor.submit(self.get_torrent_file_info, f_link): f_link for f_link in file_links}
+            for future in as_completed(futures):
+                entry = future.result()
+                logging.debug(f'Link: {futures[future]}, file torrent name: {entry.get("name") if entry else None}')
+                if entry and (entry.get('name') == name):
+                    return self._magnet_from_file_info(f_link=futures[future], entry=entry)
+        finally:
+            executor.shutdown(wait=False, cancel_futures=True)
         return None
 
-    @staticmethod
-    def get_title(text):
-        title = html.fromstring(text).xpath('//h1//text()')
-        if title:
-            return title[0]
-        else:
-            return None
-
-    @staticmethod
-    def get_poster(text):
-        img_src = html.fromstring(text).xpath('//div[contains(@class, "poster_bg")]//img/@src')
-        if img_src:
-            return img_src[0]
-        else:
-            return None
-
 
 class AniLibria(AniDub):
-    def __init__(self, *args, **kwargs):
-        super().__init__(*args, **kwargs)
-        self._file_links_xpath = '//div[@class="download-torrent"]//a[@class="torrent-download-link"]/@href'
 
-    @staticmethod
-    def get_title(text):
-        title = html.fromstring(text).xpath('//head/title/text()')
-        if title:
-            return title[0]
-        else:
-            return None
+    file_links_xpath = '//div[@class="download-torrent"]//a[@class="torrent-download-link"]/@href'
+    title_xpath = '//head/title/text()'
+    poster_xpath = '//img[@class="detail_torrent_pic"]/@src'
 
-    def get_poster(self, text):
-        page = html.fromstring(text)
-        page.make_links_absolute(self._server_url)
-        img_src = page.xpath('//img[@class="detail_torrent_pic"]/@src')
-        if img_src:
-            return img_src[0]
-        else:
-            return None
+    @classmethod
+    def get_poster(cls, page):
+        page = TrackerPage.wrap(page)
+        img_src = page.first(cls.poster_xpath)
+        if img_src and page.url:
+            return urllib.parse.urljoin(str(page.url), str(img_src))
+        return img_src
 
 
 class Kinozal(AniDub):
+
+    rate_limit = 1
+    rate_burst = 3
+    file_links_xpath = '//td[@class="nw"]/a/@href'
+    title_xpath = '//meta[@property="og:title"]/@content'
+    poster_xpath = '//meta[@property="og:image"]/@content'
+    _logo_xpath = '//div[@class="logo_new"]/a/@href'
+    mirrors = tuple(KINOZAL['kinozal_id'])
+    # auth cookies are kept by requests session
+    http2 = False
+    url_template = 'https://{mirror}/details.php?id='
+
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
-        self._file_links_xpath = '//td[@class="nw"]/a/@href'
-        self._url_pattern = 'https://kinozal.tv/details.php?id='
-        self._login_url = 'https://kinozal.tv/takelogin.php'
         self.logged_in = False
         self._login, self._password = list(kwargs.get('secrets', dict()).get('kinozal_id', {None: None}).items())[0]
-        if self._login and self._password:
-            resp = self._get_auth()
-            self._check_auth(resp)
-        else:
+        # url pattern is reset by AniDub, user is logged in here too
+        self.use_mirror(self.mirror)
+        if not (self._login and self._password):
             logging.warning(f'Auth problem: login: {self._login},'
                             f' password: {"*" * len(self._password) if self._password else self._password},'
                             f' url: {self._login_url}')
 
+    def _set_mirror(self, mirror):
+        super()._set_mirror(mirror)
+        self._login_url = f'https://{mirror}/takelogin.php'
+
+    def _mirror_changed(self):
+        # cookies are bound to domain, so user is logged in again on every mirror
+        if self._login and self._password:
+            resp = self._get_auth()
+            self._check_auth(resp)
+
     def _get_auth(self):
         data = {'username': self._login, 'password': self._password, 'returnto': ''}
         logging.debug(f'login: {self._login},'
@@ -785,6 +2460,7 @@ class Kinozal(AniDub):
 
     def _check_auth(self, resp):
         if resp and (resp.status_code == 200):
+            from lxml import html
             u_details = html.fromstring(resp.text).xpath('//div[@class="menu"]//ul[@class="men"]//a/@href')
             for i in u_details:
                 if 'userdetails.php' in i:
@@ -801,27 +2477,34 @@ class Kinozal(AniDub):
     #     return wrapper
     #
     # @is_logged_in
-    def get_torrent_page(self, torrent_id):
+    def get_topic_url(self, torrent_id):
+        return f'{self._url_pattern}{torrent_id}'
+
+    def get_torrent_page(self, torrent_id, headers=None):
         if self._session:
-            self._server_url = f'{self._url_pattern}{torrent_id}'
-            resp = self._server_request(url=self._server_url)
+            url = self.get_topic_url(torrent_id=torrent_id)
+            resp = self._server_request(url=url, headers=headers)
+            if self.failover(resp=resp, url=url):
+                if hasattr(resp, 'close'):
+                    resp.close()
+                resp = self._server_request(url=self.get_topic_url(torrent_id=torrent_id), headers=headers)
         else:
             resp = None
         return resp
 
-    def get_magnet_from_file(self, text):
-        magnet_from_file = super().get_magnet_from_file(text=text)
+    def get_magnet_from_file(self, page, name=None):
+        page = TrackerPage.wrap(page, url=self._server_url)
+        magnet_from_file = super().get_magnet_from_file(page=page, name=name)
         if not magnet_from_file:
-            torrent_id = self._server_url.split(self._url_pattern)[-1]
+            torrent_id = URL(str(page.url)).query.get('id')
             t_hash = self.get_hash_from_server(torrent_id=torrent_id)
             magnet_from_file = f'magnet:?xt=urn:btih:{t_hash}'
         return magnet_from_file
 
     def get_hash_from_server(self, torrent_id):
         if self._session:
-            self._server_url = f'{self._url_pattern}{torrent_id}'
-            logging.debug(f'URL: {self._server_url}')
-            resp = self._server_request(url=f'https://kinozal.tv/get_srv_details.php?id={torrent_id}&action=2')
+            logging.debug(f'URL: {self.get_topic_url(torrent_id=torrent_id)}')
+            resp = self._server_request(url=f'https://{self.mirror}/get_srv_details.php?id={torrent_id}&action=2')
             pattern = re.compile(r': ([a-fA-F0-9]{40})</li>')
             search_res = pattern.search(resp.text)
             if search_res:
@@ -832,24 +2515,17 @@ class Kinozal(AniDub):
             t_hash = None
         return t_hash
 
-    @staticmethod
-    def get_title(text):
-        meta_og_title = html.fromstring(text).xpath('//meta[@property="og:title"]/@content')
-        if meta_og_title:
-            return meta_og_title[0]
-        else:
-            return None
-
-    @staticmethod
-    def get_poster(text):
-        logo_href = html.fromstring(text).xpath('//div[@class="logo_new"]/a/@href')
+    @classmethod
+    def get_poster(cls, page):
+        page = TrackerPage.wrap(page)
+        logo_href = page.first(cls._logo_xpath)
         if logo_href:
-            domain = logo_href[0]
+            domain = logo_href
         else:
             domain = 'https://kinozal.tv'
-        meta_og_image = html.fromstring(text).xpath('//meta[@property="og:image"]/@content')
+        meta_og_image = page.first(cls.poster_xpath)
         if meta_og_image:
-            img_link_path = meta_og_image[0]
+            img_link_path = meta_og_image
             if 'http' in img_link_path:
                 return img_link_path
             else:
@@ -859,65 +2535,44 @@ class Kinozal(AniDub):
 
 
 class NewStudio(TorrentsSource):
+
+    magnet_xpath = '//div[@class="pagination-centered"]//a/@href'
+    streaming = True
+    encoding = 'utf-8'
+    title_xpath = '//span[@class="post-b"]/text()'
+    poster_xpath = '//var[contains(@class, "postImg")]/@title'
+
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
         self._url_pattern = 'http://newstudio.tv/viewtopic.php?t='
 
     # some problems with encoding detection
-    def get_torrent_page(self, torrent_id):
-        resp = super().get_torrent_page(torrent_id=torrent_id)
-        resp.encoding = 'utf-8'
+    def get_torrent_page(self, torrent_id, headers=None, stream=False):
+        resp = super().get_torrent_page(torrent_id=torrent_id, headers=headers, stream=stream)
+        resp.encoding = self.encoding
         return resp
 
-    @staticmethod
-    def get_magnet(text, xpath='//div[@class="pagination-centered"]//a/@href'):
-        return TorrentsSource.get_magnet(text=text, xpath=xpath)
-
-    @staticmethod
-    def get_title(text):
-        main_title = html.fromstring(text).xpath('//span[@class="post-b"]/text()')
-        if main_title:
-            return main_title[0]
-        else:
-            return None
-
-    @staticmethod
-    def get_poster(text):
-        img_src = html.fromstring(text).xpath('//var[contains(@class, "postImg")]/@title')
-        if img_src:
-            return img_src[0]
-        else:
-            return None
-
 
 class PiratBit(TorrentsSource):
-    def __init__(self, *args, **kwargs):
-        super().__init__(*args, **kwargs)
-        self._url_pattern = 'https://piratbit.org/topic/'
 
-    @staticmethod
-    def get_magnet(text, xpath='//a[contains(@class, "btn-info mob")]/@href'):
-        return TorrentsSource.get_magnet(text=text, xpath=xpath)
+    magnet_xpath = '//a[contains(@class, "btn-info mob")]/@href'
+    streaming = True
+    title_xpath = '//h2[@class="title_topic"]/a/@title'
+    poster_xpath = '//meta[@property="og:image"]/@content'
+    mirrors = tuple(PIRATBIT['piratbit_id'])
+    url_template = 'https://{mirror}/topic/'
 
-    @staticmethod
-    def get_title(text):
-        main_title = html.fromstring(text).xpath('//h2[@class="title_topic"]/a/@title')
-        if main_title:
-            return main_title[0]
-        else:
-            return None
 
-    @staticmethod
-    def get_poster(text):
-        meta_og_image = html.fromstring(text).xpath('//meta[@property="og:image"]/@content')
-        if meta_og_image:
-            return meta_og_image[0]
-        else:
-            return None
+# command line mode, tracker and tracker class
+TRACKERS_MODES = [('rutor', RUTOR, RuTor), ('nnmclub', NNMCLUB, NnmClub), ('torrentby', TORRENTBY, TorrentBy),
+                  ('kinozal', KINOZAL, Kinozal), ('rutracker', RUTRACKER, Rutracker), ('anidub', ANIDUB, AniDub),
+                  ('anilibria', ANILIBRIA, AniLibria), ('newstudio', NEWSTUDIO, NewStudio),
+                  ('piratbit', PIRATBIT, PiratBit)]
 
 
 class ArgsParser:
     def __init__(self, desc, def_settings_file=None):
+        self._args = None
         self.parser = argparse.ArgumentParser(description=desc, add_help=True)
         self.parser.add_argument('--settings', action='store', dest='settings', type=str, default=def_settings_file,
                                  help='settings file for future purposes')
@@ -960,61 +2615,418 @@ class ArgsParser:
                                  help='Enable DEBUG log level')
         self.parser.add_argument('--file', action='store_true', dest='file', default=False,
                                  help='Enable logging to file')
+        self.parser.add_argument('--workers', action='store', dest='workers', type=int, default=8,
+                                 help='number of tracker pages fetched in parallel')
+        self.parser.add_argument('--host_limit', action='store', dest='host_limit', type=int, default=2,
+                                 help='max simultaneous requests to one host')
+        self.parser.add_argument('--http2', action='store_true', dest='http2', default=False,
+                                 help='use HTTP/2 with https trackers, needs httpx[http2] package')
+        self.parser.add_argument('--cache_dir', action='store', dest='cache_dir', type=str,
+                                 default=os.path.join(os.path.expanduser('~'), '.cache', 'ts_series_updater'),
+                                 help='folder for cache of tracker pages, empty string to disable cache')
+        self.parser.add_argument('--cache_size', action='store', dest='cache_size', type=int, default=10,
+                                 help='max size of tracker pages cache, MB')
+        self.parser.add_argument('--file_ttl', action='store', dest='file_ttl', type=int, default=0,
+                                 help='use cached .torrent files of anidub, anilibria and kinozal without request '
+                                      'for FILE_TTL minutes, 0 to revalidate on every check')
+        self.parser.add_argument('--stream', action='store_true', dest='stream', default=False,
+                                 help='download tracker pages partially, until title, magnet and poster are found')
+        self.parser.add_argument('--recheck_after', action='store', dest='recheck_after', type=int, default=0,
+                                 help='skip topics confirmed unchanged less than RECHECK_AFTER minutes ago, '
+                                      '0 to check all topics')
+        self.parser.add_argument('--daemon', action='store_true', dest='daemon', default=False,
+                                 help='run updates in a loop, check interval of each series adapts to its changes')
+        self.parser.add_argument('--daemon_interval', action='store', dest='daemon_interval', type=int, default=10,
+                                 help='daemon mode: minutes between update passes')
+        self.parser.add_argument('--max_recheck_after', action='store', dest='max_recheck_after', type=int,
+                                 default=720, help='daemon mode: max minutes between checks of not changed series')
+        self.parser.add_argument('--parallel', action='store_true', dest='parallel', default=False,
+                                 help='update all selected trackers in parallel, each in its own thread')
+        self.parser.add_argument('--metrics_file', action='store', dest='metrics_file', type=str, default='',
+                                 help='write metrics of requests, parsing and updates as json to file after each run')
+        self.parser.add_argument('--metrics_textfile', action='store', dest='metrics_textfile', type=str, default='',
+                                 help='write metrics to file for prometheus node_exporter textfile collector, '
+                                      'file name must end with .prom')
+        self.parser.add_argument('--dry_run', '--dry-run', action='store_true', dest='dry_run', default=False,
+                                 help='check all selected modes and log planned changes, TorrServer is not changed')
+        self.parser.add_argument('--profile', action='store', dest='profile', type=str, default='',
+                                 help='profile run and write profile.pstats, profile.txt and trace.json '
+                                      '(Chrome trace of update phases) to PROFILE folder')
+        self.parser.add_argument('--metrics_port', action='store', dest='metrics_port', type=int, default=0,
+                                 help='daemon mode: serve prometheus metrics on http://0.0.0.0:METRICS_PORT/metrics')
 
     @property
     def args(self):
-        return self.parser.parse_args()
+        """Arguments are parsed once, --all switches on all trackers modes"""
+        if self._args is None:
+            self._args = self.parser.parse_args()
+            if self._args.all:
+                for mode, _, _ in TRACKERS_MODES:
+                    setattr(self._args, mode, True)
+        return self._args
+
+
+def fetch_tracker_torrent(tracker_class, torrent_id, torrents_list, torrserver, logger=logging, page_cache=None,
+                          stream=False):
+    """Download and parse tracker page for one torrent id, runs in worker threads
+
+    Only reads from TorrServer, all mutations are done by the caller.
+    With page_cache, page is requested with conditional GET and data from cache is used if page not modified.
+    With stream, page of tracker class with streaming support is downloaded only until all values are found.
+
+    :return: dict with title, magnet, hash, poster and page url, dict with host_down if tracker is down
+             or None if page not available
+    """
+    cls = tracker_class
+    url = cls.get_topic_url(torrent_id=torrent_id)
+    cache_entry = None
+    if page_cache and cls.cacheable:
+        cache_entry = page_cache.get(url)
+    headers = PageCache.validators(cache_entry)
+    source = type(cls).__name__
+    with PROFILER.span(source, 'fetch', topic=torrent_id):
+        if stream and cls.streaming:
+            resp = cls.get_torrent_page(torrent_id=torrent_id, headers=headers, stream=True)
+        else:
+            stream = False
+            resp = cls.get_torrent_page(torrent_id=torrent_id, headers=headers)
+    if resp is cls.host_down_response:
+        logger.debug(f'{url} => tracker is down, postponed')
+        return {'host_down': True}
+    if cls.mirrors and getattr(resp, 'url', None):
+        # page of failed mirror is requested from the next one, link and cache key are of the used mirror
+        history = getattr(resp, 'history', None)
+        requested = urllib.parse.urlsplit(str(history[0].url if history else resp.url))
+        parts = urllib.parse.urlsplit(str(url))
+        if requested.netloc != parts.netloc:
+            url = parts._replace(netloc=requested.netloc).geturl()
+    # error responses are falsy, streamed one is closed to free host slot
+    if stream and (resp is not None) and (resp.status_code != 200) and hasattr(resp, 'close'):
+        resp.close()
+    if resp and (resp.status_code == 304) and cache_entry:
+        logger.debug(f'{url} => not modified, cached data used')
+        return cache_entry.get('page') | {'fingerprint': cache_entry.get('etag') or cache_entry.get('last_modified')}
+    if not (resp and resp.status_code == 200):
+        logger.warning(f'{url} => {resp.status_code if resp else None}, page not available')
+        return None
+    if stream:
+        # body is downloaded and parsed by turns, only parsing is counted in parse duration
+        with PROFILER.span(source, 'fetch', topic=torrent_id, body='stream'):
+            tracker_page = cls.read_page(resp=resp, url=url, stream=True)
+    parse_started = time.perf_counter()
+    with PROFILER.span(source, 'parse', topic=torrent_id):
+        if not stream:
+            tracker_page = cls.read_page(resp=resp, url=url)
+        t_title = cls.get_title(page=tracker_page)
+        t_poster = cls.get_poster(page=tracker_page)
+        # magnet of anime trackers is made from .torrent file, download of the file is not a part of parsing
+        t_magnet = None if isinstance(cls, AniDub) else cls.get_magnet(page=tracker_page)
+    METRICS.observe('parse_duration_seconds', tracker_page.parse_seconds + time.perf_counter() - parse_started,
+                    source=source)
+    if isinstance(cls, AniDub):
+        fl_torrent = torrents_list[0]
+        fl_t_hash = fl_torrent.get('t_hash')
+        with PROFILER.span(source, 'torrent file', topic=torrent_id):
+            fl_t_info = torrserver.get_torrent_stat(t_hash=fl_t_hash)
+            if fl_t_info.status_code == 200:
+                t_file_name = fl_t_info.json().get('name')
+                t_magnet = cls.get_magnet_from_file(page=tracker_page, name=t_file_name)
+                t_hash = cls.get_hash_from_magnet(magnet_link=t_magnet)
+            else:
+                t_magnet = None
+                t_hash = None
+    else:
+        t_hash = cls.get_hash_from_magnet(magnet_link=t_magnet)
+    page = {'title': t_title, 'magnet': t_magnet, 'hash': t_hash, 'poster': t_poster, 'url': url}
+    if page_cache and cls.cacheable and t_hash:
+        page_cache.put(url=url, resp=resp, page=page)
+    fingerprint = None
+    if getattr(resp, 'headers', None):
+        fingerprint = resp.headers.get('ETag') or resp.headers.get('Last-Modified')
+    if not fingerprint:
+        fingerprint = hashlib.sha1(resp.text.encode('utf-8')).hexdigest()
+    return page | {'fingerprint': fingerprint}
+
+
+@PROFILER.traced('plan')
+def plan_tracker_torrent(page, source, torrent_id, torrents_list, torrserver, logger=logging):
+    """Compare parsed tracker page with torrents on TorrServer, only reads from TorrServer
+
+    :return: PlannedUpdate if there is new torrent on tracker, None otherwise
+    """
+    t_title = page.get('title')
+    t_hash = page.get('hash')
+    logger.debug(f'Poster: {page.get("poster")}')
+    logger.debug(f'New HASH: {t_hash}')
+    hashes = list()
+    for i in torrents_list:
+        old_hash = i.get('t_hash')
+        hashes.append(old_hash)
+    if t_hash and (t_hash not in hashes):
+        logger.info(f'{torrents_list[0].get("title")}')
+        logger.info(f'Found update: {t_hash}')
+        data = f'{{"TSA":{{"srcUrl":"{page.get("url")}"}}}}'
+        indexes = torrserver.get_viewed_indexes(hashes=hashes)
+
+        updated_torrent = {'link': page.get('magnet'), 'title': t_title, 'poster': page.get('poster'),
+                           'save_to_db': True, 'data': data, 'hash': t_hash}
+        return PlannedUpdate(source=source, topic_id=torrent_id, title=torrents_list[0].get('title'),
+                             torrent=updated_torrent, old_hashes=tuple(hashes), viewed=frozenset(indexes))
+    else:
+        logger.info(f'{t_title}')
+        logger.info(f'No updates found: {t_hash}')
+        return None
+
+
+def new_summary(tracker_name_id):
+    return {'tracker': tracker_name_id, 'checked': 0, 'skipped': 0, 'updated': 0, 'unavailable': 0, 'postponed': 0,
+            'errors': 0}
 
 
-def update_tracker_torrents(tracker, tracker_class, torrserver):
+def update_tracker_torrents(tracker, tracker_class, torrserver, workers=1, page_cache=None, state=None,
+                            stream=False, plan=None):
+    """Check all tracker torrents from TorrServer for updates
+
+    Tracker pages are fetched and parsed by pool of workers, found updates are added to plan,
+    TorrServer is not changed. Without plan, own plan is made and applied at the end.
+    Topics, confirmed unchanged recently by state store, are skipped.
+    Topics not checked because tracker is down are marked as pending in state store
+    and are checked first in the next run.
+
+    :return: summary dict with counters for the tracker
+    """
     tracker_name_id, tracker_url_patterns = list(tracker.items())[0]
+    logger = logging.getLogger(tracker_name_id)
     tracker_torrents = torrserver.get_tracker_torrents(tracker_id=tracker_name_id)
-    logging.info(f'Tracker: {tracker_url_patterns}; found torrents: {len(tracker_torrents)}')
-    for torrent_id, torrents_list in tracker_torrents.items():
-        cls = tracker_class
-        resp = cls.get_torrent_page(torrent_id=torrent_id)
-        if resp and resp.status_code == 200:
-            t_title = cls.get_title(text=resp.text)
-            if isinstance(cls, AniDub):
-                fl_torrent = torrents_list[0]
-                fl_t_hash = fl_torrent.get('t_hash')
-                fl_t_info = torrserver.get_torrent_stat(t_hash=fl_t_hash)
-                if fl_t_info.status_code == 200:
-                    t_file_name = fl_t_info.json().get('name')
-                    cls.name_from_torrent_file = t_file_name
-                    t_magnet = cls.get_magnet_from_file(text=resp.text)
-                    t_hash = cls.get_hash_from_magnet(magnet_link=t_magnet)
-                else:
-                    t_magnet = None
-                    t_hash = None
+    logger.info(f'Tracker: {tracker_url_patterns}; found torrents: {len(tracker_torrents)}')
+    summary = new_summary(tracker_name_id=tracker_name_id)
+    own_plan = plan is None
+    if own_plan:
+        plan = UpdatePlan()
+    pending = state.get_pending(tracker=tracker_name_id) if state else set()
+    with ThreadPoolExecutor(max_workers=max(workers, 1), thread_name_prefix=tracker_name_id) as executor:
+        futures = dict()
+        for torrent_id, torrents_list in sorted(tracker_torrents.items(), key=lambda item: item[0] not in pending):
+            if state and state.is_fresh(tracker=tracker_name_id, topic_id=torrent_id,
+                                        hashes=[i.get('t_hash') for i in torrents_list]):
+                logger.debug(f'{torrent_id} => checked recently, skipped')
+                summary['skipped'] += 1
+                continue
+            future = executor.submit(fetch_tracker_torrent, tracker_class=tracker_class, torrent_id=torrent_id,
+                                     torrents_list=torrents_list, torrserver=torrserver, logger=logger,
+                                     page_cache=page_cache, stream=stream)
+            futures[future] = (torrent_id, torrents_list)
+        for future in as_completed(futures):
+            torrent_id, torrents_list = futures[future]
+            try:
+                page = future.result()
+            except Exception as e:
+                logger.error(f'{torrent_id}, problem with page parsing: {e}')
+                summary['checked'] += 1
+                summary['errors'] += 1
+                continue
+            if page and page.get('host_down'):
+                # page is not requested, topic is counted as postponed only
+                summary['postponed'] += 1
+                if state:
+                    state.mark_pending(tracker=tracker_name_id, topic_id=torrent_id)
+                continue
+            summary['checked'] += 1
+            if page:
+                update = plan_tracker_torrent(page=page, source=tracker_name_id, torrent_id=torrent_id,
+                                              torrents_list=torrents_list, torrserver=torrserver, logger=logger)
+                if update:
+                    plan.add_update(update)
+                    summary['updated'] += 1
+                    METRICS.count('updates_found_total', tracker=tracker_name_id)
+                if state and page.get('hash'):
+                    state.update(tracker=tracker_name_id, topic_id=torrent_id, infohash=page.get('hash'),
+                                 fingerprint=page.get('fingerprint'))
             else:
-                t_magnet = cls.get_magnet(text=resp.text)
-                t_hash = cls.get_hash_from_magnet(magnet_link=t_magnet)
-            t_poster = cls.get_poster(text=resp.text)
-            # logging.info(f'Checking: {t_title}')
-            logging.debug(f'Poster: {t_poster}')
-            logging.debug(f'New HASH: {t_hash}')
-            hashes = list()
-            for i in torrents_list:
-                old_hash = i.get('t_hash')
-                hashes.append(old_hash)
-            if t_hash and (t_hash not in hashes):
-                logging.info(f'{torrents_list[0].get("title")}')
-                logging.info(f'Found update: {t_hash}')
-                indexes = set()
-                data = f'{{"TSA":{{"srcUrl":"{cls._server_url}"}}}}'
-                for torrent_hash in hashes:
-                    viewed_indexes_list = torrserver.get_torrent_info(t_hash=torrent_hash)
-                    for vi in viewed_indexes_list:
-                        indexes.add(vi.get('file_index'))
-
-                updated_torrent = {'link': t_magnet, 'title': t_title, 'poster': t_poster,
-                                   'save_to_db': True, 'data': data, 'hash': t_hash}
-                torrserver.add_updated_torrent(updated_torrent=updated_torrent, viewed_episodes=indexes)
-                torrserver.cleanup_torrents(hashes=hashes)
+                summary['unavailable'] += 1
+    if own_plan:
+        torrserver.apply_plan(plan)
+    return summary
+
+
+def run_tracker_update(tracker, tracker_cls, torrserver, args, page_cache=None, state=None, sources=None,
+                       plan=None):
+    """Create own tracker session and check tracker torrents, may run in separate thread
+
+    :param sources: dict for tracker sources reuse between calls, tracker_name_id => tracker source
+    """
+    tracker_name_id = list(tracker.keys())[0]
+    tracker_class = sources.get(tracker_name_id) if sources is not None else None
+    if tracker_class is None:
+        tracker_class = tracker_cls(proxy=args.proxy, host_limit=args.host_limit, secrets=torrserver.secrets,
+                                    tracker_id=tracker_name_id, cache_dir=args.cache_dir, file_ttl=args.file_ttl * 60,
+                                    http2=args.http2)
+        if sources is not None:
+            sources[tracker_name_id] = tracker_class
+    with PROFILER.span(tracker_name_id, 'tracker'):
+        tracker_class.select_mirror()
+        return update_tracker_torrents(tracker=tracker, tracker_class=tracker_class, torrserver=torrserver,
+                                       workers=args.workers, page_cache=page_cache, state=state, stream=args.stream,
+                                       plan=plan)
+
+
+def run_trackers_updates(trackers, torrserver, args, page_cache=None, state=None, sources=None, plan=None):
+    """Run updates for list of (tracker, tracker class) pairs one by one or in parallel
+
+    In parallel mode each tracker is checked in its own thread with its own session,
+    all trackers share one TorrServer snapshot and one plan.
+
+    :return: list of trackers summaries
+    """
+    summaries = list()
+    if args.parallel and len(trackers) > 1:
+        with ThreadPoolExecutor(max_workers=len(trackers), thread_name_prefix='trackers') as executor:
+            futures = {executor.submit(run_tracker_update, tracker=tracker, tracker_cls=tracker_cls,
+                                       torrserver=torrserver, args=args, page_cache=page_cache, state=state,
+                                       sources=sources, plan=plan): tracker
+                       for tracker, tracker_cls in trackers}
+            for future in as_completed(futures):
+                try:
+                    summaries.append(future.result())
+                except Exception as e:
+                    tracker_name_id = list(futures[future].keys())[0]
+                    logging.error(f'{tracker_name_id}: update failed: {e}')
+                    summaries.append(new_summary(tracker_name_id=tracker_name_id) | {'errors': 1})
+    else:
+        for tracker, tracker_cls in trackers:
+            summaries.append(run_tracker_update(tracker=tracker, tracker_cls=tracker_cls, torrserver=torrserver,
+                                                args=args, page_cache=page_cache, state=state, sources=sources,
+                                                plan=plan))
+    return summaries
+
+
+def log_summary(summaries):
+    if not summaries:
+        return
+    total = new_summary(tracker_name_id='Total')
+    for summary in summaries + [total]:
+        logging.info(f'{summary.get("tracker")}: checked {summary.get("checked")}, '
+                     f'skipped {summary.get("skipped")}, updated {summary.get("updated")}, '
+                     f'unavailable {summary.get("unavailable")}, postponed {summary.get("postponed")}, '
+                     f'errors {summary.get("errors")}')
+        if summary is not total:
+            for k in total:
+                if k != 'tracker':
+                    total[k] += summary.get(k, 0)
+
+
+@PROFILER.traced('litrcc')
+def update_litrcc_torrents(feed_uuid, torrserver, state=None, plan=None):
+    """Update and add torrents from litr.cc RSS-feed, changes are added to plan (own plan is applied at the end)"""
+    litrcc_rss_feed_url = f'https://litr.cc/feed/{feed_uuid}/json'
+    logging.info(f'litr.cc RSS uuid: {feed_uuid}')
+    litrcc = LitrCC(url=litrcc_rss_feed_url)
+    torrserver.get_litrcc_torrents()
+    own_plan = plan is None
+    if own_plan:
+        plan = UpdatePlan()
+    for torrent_external_url, litrcc_item in litrcc.torrents_index.items():
+        torrent_title = litrcc_item.get('title')
+        torrent_hash = litrcc_item.get('id')
+        torrent_poster = litrcc_item.get('image')
+        torrent_date_modified = litrcc_item.get('date_modified')
+        # logging.info(f'Checking: {torrent_title}')
+        ts_torrents = torrserver.litrcc_torrents_index.get(torrent_external_url)
+        if ts_torrents:
+            # logging.info(f'{torrent_title} will be updated')
+            hashes = {ts_item.get('t_hash'): ts_item.get('title') for ts_item in ts_torrents}
+            if state and state.is_fresh(tracker='litrcc', topic_id=torrent_external_url, hashes=hashes,
+                                        fingerprint=torrent_date_modified):
+                logging.debug(f'{torrent_external_url} => checked recently, skipped')
+                continue
+            if torrent_hash and (torrent_hash not in hashes.keys()):
+                logging.info(f'{list(hashes.values())[0]}')
+                logging.info(f'Found update: {torrent_external_url}')
+                METRICS.count('updates_found_total', tracker='litrcc')
+                data = f'{{"LITRCC":{{"external_url":"{torrent_external_url}"}}}}'
+                indexes = torrserver.get_viewed_indexes(hashes=hashes.keys())
+                torrserver_torrent = {'link': f'magnet:?xt=urn:btih:{torrent_hash}', 'title': torrent_title,
+                                      'poster': torrent_poster, 'save_to_db': True, 'data': data,
+                                      'hash': torrent_hash}
+                plan.add_update(PlannedUpdate(source='litrcc', topic_id=torrent_external_url,
+                                              title=list(hashes.values())[0], torrent=torrserver_torrent,
+                                              old_hashes=tuple(hashes), viewed=frozenset(indexes)))
             else:
-                logging.info(f'{t_title}')
-                logging.info(f'No updates found: {t_hash}')
+                logging.info(f'{torrent_title}')
+                logging.info(f'No new episodes found: {torrent_external_url}')
+        else:
+            logging.info(f'{torrent_title}')
+            logging.info(f'New hash, {torrent_hash}, will be added to the server list')
+            data = f'{{"LITRCC":{{"external_url":"{torrent_external_url}"}}}}'
+            torrserver_torrent = {'link': f'magnet:?xt=urn:btih:{torrent_hash}', 'title': torrent_title,
+                                  'poster': torrent_poster, 'save_to_db': True, 'data': data, 'hash': torrent_hash}
+            plan.add_update(PlannedUpdate(source='litrcc', topic_id=torrent_external_url, title=torrent_title,
+                                          torrent=torrserver_torrent))
+        if state and torrent_hash:
+            state.update(tracker='litrcc', topic_id=torrent_external_url, infohash=torrent_hash,
+                         fingerprint=torrent_date_modified)
+    if own_plan:
+        torrserver.apply_plan(plan)
+
+
+def record_summaries(summaries):
+    for summary in summaries:
+        for k, v in summary.items():
+            if (k != 'tracker') and v:
+                METRICS.count('topics_total', v, tracker=summary.get('tracker'), result=k)
+
+
+def run_updates(args, torrserver, page_cache=None, state=None, sources=None):
+    """One pass of all selected modes: cleanup, litr.cc and trackers, metrics are written at the end
+
+    All modes only plan changes, TorrServer is changed by one apply step after all checks,
+    with --dry_run the plan is logged and not applied.
+    """
+    started = time.monotonic()
+    plan = UpdatePlan()
+    if args.cleanup:
+        logging.warning(f'Permanent cleanup mode!!! Will be deleted torrents duplicates.')
+        plan.remove(hashes=torrserver.get_cleanup_hashes(), reason='duplicate with fewer files')
+
+    if args.litrcc:
+        update_litrcc_torrents(feed_uuid=args.litrcc, torrserver=torrserver, state=state, plan=plan)
+
+    trackers = [(tracker, tracker_cls) for mode, tracker, tracker_cls in TRACKERS_MODES if getattr(args, mode)]
+    summaries = run_trackers_updates(trackers=trackers, torrserver=torrserver, args=args, page_cache=page_cache,
+                                     state=state, sources=sources, plan=plan)
+    log_summary(summaries=summaries)
+    if args.dry_run:
+        for line in plan.describe():
+            logging.info(line)
+        logging.info('Dry run, TorrServer is not changed')
+    elif len(plan):
+        torrserver.apply_plan(plan)
+    record_summaries(summaries=summaries)
+    METRICS.set('run_duration_seconds', round(time.monotonic() - started, 3))
+    METRICS.set('last_run_timestamp_seconds', round(time.time(), 3))
+    METRICS.write(json_path=args.metrics_file, textfile_path=args.metrics_textfile)
+
+
+def run_daemon(args, torrserver, page_cache=None, state=None):
+    """Run updates in a loop, keeping trackers sessions between passes
+
+    Only topics due for check are requested on every pass, check interval of each topic
+    depends on how long ago it was changed (see StateStore.is_fresh).
+    """
+    sources = dict()
+    logging.info(f'Daemon mode, pass every {args.daemon_interval} minutes')
+    try:
+        while True:
+            started = time.monotonic()
+            try:
+                run_updates(args=args, torrserver=torrserver, page_cache=page_cache, state=state, sources=sources)
+            except Exception as e:
+                logging.exception(f'Update pass failed: {e}')
+            time.sleep(max(args.daemon_interval * 60 - (time.monotonic() - started), 0))
+            torrserver.refresh()
+    except KeyboardInterrupt:
+        logging.info('Daemon stopped')
+
 
 def setup_logging(to_file: bool = False, debug: bool = False, filename: str = 'ts_series_updater.log'):
     """
@@ -1047,104 +3059,65 @@ def main():
 
     desc = f'Awesome series updater for TorrServer, (c) 2023-2025 Mantikor, version {__version__}'
 
-    ts = ArgsParser(desc=desc, def_settings_file=None)
-    setup_logging(to_file=ts.args.file, debug=ts.args.debug)
+    args = ArgsParser(desc=desc, def_settings_file=None).args
+    setup_logging(to_file=args.file, debug=args.debug)
     logging.info(desc)
 
-    if ts.args.settings:
+    if args.profile:
+        PROFILER.start()
+        try:
+            run_modes(args=args)
+        finally:
+            PROFILER.stop(folder=args.profile)
+    else:
+        run_modes(args=args)
+
+
+def run_modes(args):
+    """Run selected modes with parsed arguments"""
+    if args.settings:
         # ToDO: add settings flow
-        settings = Config(filename=ts.args.settings)
+        settings = Config(filename=args.settings)
 
-    version = Updater(schedule=2)
-    if ts.args.version:
-        version.check_updates(only_new=False)
+    version = Updater(schedule=2, cache_dir=args.cache_dir)
+    if args.version:
+        version.check_updates(only_new=False, use_cache=False)
         sys.exit(0)
     else:
         version.check_scheduled_updates(schedule=version.schedule)
 
-    torr_server = TorrServer(**{k: v for k, v in vars(ts.parser.parse_args()).items()}, tracker_id='torrserver')
-
-    if ts.args.all:
-        ts.parser.set_defaults(rutor=True, nnmclub=True, torrentby=True, kinozal=True, rutracker=True, anidub=True,
-                               anilibria=True, newstudio=True, piratbit=True)
-
-    if ts.args.cleanup:
-        torr_server.cleanup_torrents(perm=True)
-
-    if ts.args.rutor:
-        update_tracker_torrents(tracker=RUTOR, tracker_class=RuTor(proxy=ts.args.proxy), torrserver=torr_server)
-
-    if ts.args.litrcc:
-        litrcc_rss_feed_url = f'https://litr.cc/feed/{ts.args.litrcc}/json'
-        logging.info(f'litr.cc RSS uuid: {ts.args.litrcc}')
-        litrcc = LitrCC(url=litrcc_rss_feed_url)
-        torr_server.get_litrcc_torrents()
-        for litrcc_item in litrcc.torrents_list:
-            torrent_external_url = litrcc_item.get('external_url')
-            torrent_title = litrcc_item.get('title')
-            torrent_hash = litrcc_item.get('id')
-            torrent_poster = litrcc_item.get('image')
-            # logging.info(f'Checking: {torrent_title}')
-            if torrent_external_url in torr_server.litrcc_torrents_cache:
-                # logging.info(f'{torrent_title} will be updated')
-                hashes = dict()
-                for ts_item in torr_server.litrcc_torrents_list:
-                    ts_external_url = ts_item.get('t_url')
-                    ts_title = ts_item.get('title')
-                    ts_hash = ts_item.get('t_hash')
-                    ts_poster = ts_item.get('poster')
-                    if torrent_external_url == ts_external_url:
-                        hashes[ts_hash] = ts_title
-                if torrent_hash and (torrent_hash not in hashes.keys()):
-                    logging.info(f'{list(hashes.values())[0]}')
-                    logging.info(f'Found update: {torrent_external_url}')
-                    indexes = set()
-                    data = f'{{"LITRCC":{{"external_url":"{torrent_external_url}"}}}}'
-                    for t_hash in hashes.keys():
-                        viewed_indexes_list = torr_server.get_torrent_info(t_hash=t_hash)
-                        for vi in viewed_indexes_list:
-                            indexes.add(vi.get('file_index'))
-                    torrserver_torrent = {'link': f'magnet:?xt=urn:btih:{torrent_hash}', 'title': torrent_title,
-                                          'poster': torrent_poster, 'save_to_db': True, 'data': data,
-                                          'hash': torrent_hash}
-                    torr_server.add_updated_torrent(updated_torrent=torrserver_torrent, viewed_episodes=indexes)
-                    torr_server.cleanup_torrents(hashes=hashes.keys())
-                else:
-                    logging.info(f'{torrent_title}')
-                    logging.info(f'No new episodes found: {torrent_external_url}')
-            else:
-                logging.info(f'{torrent_title}')
-                logging.info(f'New hash, {torrent_hash}, will be added to the server list')
-                data = f'{{"LITRCC":{{"external_url":"{torrent_external_url}"}}}}'
-                torrserver_torrent = {'link': f'magnet:?xt=urn:btih:{torrent_hash}', 'title': torrent_title,
-                                      'poster': torrent_poster, 'save_to_db': True, 'data': data, 'hash': torrent_hash}
-                torr_server.add_torrent(torrent=torrserver_torrent)
-
-    if ts.args.nnmclub:
-        update_tracker_torrents(tracker=NNMCLUB, tracker_class=NnmClub(proxy=ts.args.proxy), torrserver=torr_server)
-
-    if ts.args.torrentby:
-        update_tracker_torrents(tracker=TORRENTBY, tracker_class=TorrentBy(proxy=ts.args.proxy), torrserver=torr_server)
-
-    if ts.args.kinozal:
-        update_tracker_torrents(tracker=KINOZAL,
-                                tracker_class=Kinozal(secrets=torr_server.secrets, proxy=ts.args.proxy,
-                                                      tracker_id='kinozal_id'), torrserver=torr_server)
-
-    if ts.args.rutracker:
-        update_tracker_torrents(tracker=RUTRACKER, tracker_class=Rutracker(proxy=ts.args.proxy), torrserver=torr_server)
+    torr_server = TorrServer(**vars(args) | {'tracker_id': 'torrserver'})
 
-    if ts.args.anidub:
-        update_tracker_torrents(tracker=ANIDUB, tracker_class=AniDub(proxy=ts.args.proxy), torrserver=torr_server)
-
-    if ts.args.anilibria:
-        update_tracker_torrents(tracker=ANILIBRIA, tracker_class=AniLibria(proxy=ts.args.proxy), torrserver=torr_server)
-
-    if ts.args.newstudio:
-        update_tracker_torrents(tracker=NEWSTUDIO, tracker_class=NewStudio(proxy=ts.args.proxy), torrserver=torr_server)
-
-    if ts.args.piratbit:
-        update_tracker_torrents(tracker=PIRATBIT, tracker_class=PiratBit(proxy=ts.args.proxy), torrserver=torr_server)
+    state = None
+    if args.cache_dir:
+        import sqlite3
+        try:
+            state = StateStore(path=os.path.join(args.cache_dir, 'state.sqlite3'),
+                               recheck_after=args.recheck_after * 60, read_only=args.dry_run)
+        except (OSError, sqlite3.Error) as e:
+            logging.warning(f'State store: {e}, topics state is not kept between runs')
+    if args.daemon and (state is None):
+        state = StateStore(path=':memory:', recheck_after=args.recheck_after * 60, read_only=args.dry_run)
+    if args.daemon:
+        state.recheck_after = state.recheck_after or StateStore.daemon_recheck_after
+        state.max_recheck_after = args.max_recheck_after * 60
+    page_cache = None
+    if args.cache_dir:
+        try:
+            page_cache = PageCache(path=os.path.join(args.cache_dir, 'pages'),
+                                   max_size=args.cache_size * 1024 * 1024, read_only=args.dry_run)
+        except OSError as e:
+            logging.warning(f'Page cache: {e}, pages are not cached')
+
+    if args.daemon:
+        if args.metrics_port:
+            METRICS.serve(port=args.metrics_port)
+        run_daemon(args=args, torrserver=torr_server, page_cache=page_cache, state=state)
+    else:
+        run_updates(args=args, torrserver=torr_server, page_cache=page_cache, state=state)
+    if state:
+        state.close()
+    version.wait(timeout=version.check_timeout)
 
 
 if __name__ == '__main__':
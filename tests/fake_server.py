@@ -0,0 +1,227 @@
+#!/usr/bin/python3
+# -*- coding: utf-8 -*-
+# coding: utf8
+
+"""
+Local stand-in for TorrServer and trackers for end-to-end tests and load tests
+
+TorrServer endpoints: torrents (list/add/rem/get), viewed (list/set), stream/fname?link=...&stat.
+Tracker pages are served from tests/fixtures/<tracker>.html for requests sent through the server as http proxy
+(--proxy http://127.0.0.1:<port>), .torrent files of anime trackers are made on the fly.
+Latency and error rate of tracker responses may be injected, all requests are counted.
+"""
+
+
+import os
+import re
+import json
+import random
+import threading
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit, parse_qs
+from series_updater import TorrentsSource
+
+
+FIXTURES_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures')
+
+
+def load_fixture(tracker):
+    with open(os.path.join(FIXTURES_PATH, f'{tracker}.html'), mode='r', encoding='utf-8') as fixture:
+        return fixture.read()
+
+
+def render_page(template, t_id, t_hash, title, padding=0):
+    magnet = f'magnet:?xt=urn:btih:{t_hash}&dn={t_id}'
+    # real topic pages have comments, descriptions and scripts after the data we need
+    filler = ''.join(f'<div class="comment">comment {i} {"x" * 80}</div>\n' for i in range(padding * 10))
+    return (template.replace('{{t_id}}', str(t_id)).replace('{{t_hash}}', t_hash).replace('{{magnet}}', magnet)
+            .replace('{{title}}', title).replace('{{padding}}', filler))
+
+
+def make_torrent_file(name, t_id):
+    name = name.encode('utf-8')
+    announce = b'http://tracker.example/announce'
+    info = b'd6:lengthi%de4:name%d:%s12:piece lengthi262144e6:pieces20:%se' % (t_id, len(name), name, b'\0' * 20)
+    return b'd8:announce%d:%s4:info%se' % (len(announce), announce, info)
+
+
+class FakeServer(object):
+    """TorrServer API and tracker pages on 127.0.0.1 in background thread
+
+    :param tracker_latency: seconds before tracker response
+    :param error_rate: part of tracker requests answered with 503
+    :param padding: size of filler added to tracker pages, KB
+    """
+
+    def __init__(self, tracker_latency=0.0, torrserver_latency=0.0, error_rate=0.0, padding=0, seed=0):
+        self.tracker_latency = tracker_latency
+        self.torrserver_latency = torrserver_latency
+        self.error_rate = error_rate
+        self.padding = padding
+        self.torrents = dict()
+        self.viewed = set()
+        # (tracker, topic id) => (current hash, title)
+        self.topics = dict()
+        self.requests = Counter()
+        self._templates = dict()
+        self._random = random.Random(seed)
+        self._lock = threading.RLock()
+        self._httpd = None
+        self._thread = None
+
+    @property
+    def port(self):
+        return self._httpd.server_address[1]
+
+    @property
+    def url(self):
+        return f'http://127.0.0.1:{self.port}'
+
+    def start(self):
+        self._httpd = ThreadingHTTPServer(('127.0.0.1', 0), self._make_handler())
+        self._httpd.daemon_threads = True
+        # clients close streamed responses early, connection resets are expected
+        self._httpd.handle_error = lambda request, client_address: None
+        self._thread = threading.Thread(target=self._httpd.serve_forever, name='fake-server', daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        if self._httpd:
+            self._httpd.shutdown()
+            self._httpd.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def add_torrent(self, t_hash, title, src_url, files=8):
+        self.torrents[t_hash] = {'hash': t_hash, 'title': title, 'poster': '', 'timestamp': 0, 'stat': 3,
+                                 'stat_string': 'Torrent working', 'torrent_size': files * 1024 ** 3,
+                                 'data': json.dumps({'TSA': {'srcUrl': src_url}}), 'files': files}
+
+    def add_library(self, count, url_pattern='http://rutor.info/torrent/{t_id}', tracker='rutor', updated=0.1):
+        """Torrents of one tracker on TorrServer, updated part of them has new hash on tracker"""
+        for t_id in range(1, count + 1):
+            old_hash = f'{t_id:040x}'
+            title = f'Series {t_id} [01-08 of 10]'
+            self.add_torrent(t_hash=old_hash, title=title, src_url=url_pattern.format(t_id=t_id))
+            self.viewed.update((old_hash, index) for index in range(1, 4))
+            is_updated = self._random.random() < updated
+            new_hash = f'{t_id:040x}'.replace('0', 'f') if is_updated else old_hash
+            self.topics[(tracker, str(t_id))] = (new_hash, title.replace('08', '09') if is_updated else title)
+
+    def _template(self, tracker):
+        if tracker not in self._templates:
+            self._templates[tracker] = load_fixture(tracker)
+        return self._templates[tracker]
+
+    def _count(self, key):
+        with self._lock:
+            self.requests[key] += 1
+
+    def _failed(self):
+        with self._lock:
+            return self.error_rate and (self._random.random() < self.error_rate)
+
+    # TorrServer
+
+    def torrserver(self, path, body):
+        self._count(f'torrserver {path.split("?")[0]} {body.get("action", "") if body else ""}'.strip())
+        action = body.get('action') if body else None
+        if path == '/torrents':
+            if action == 'list':
+                return 200, [{k: v for k, v in t.items() if k != 'files'} for t in self.torrents.values()]
+            if action == 'add':
+                t_hash = body.get('hash') or re.search(r'btih:([0-9a-fA-F]{40})', body.get('link', '')).group(1)
+                self.add_torrent(t_hash=t_hash.lower(), title=body.get('title'),
+                                 src_url=json.loads(body.get('data')).get('TSA', dict()).get('srcUrl'), files=9)
+                return 200, self.torrents[t_hash.lower()]
+            if action == 'rem':
+                self.torrents.pop(body.get('hash'), None)
+                return 200, None
+            if action == 'get':
+                torrent = self.torrents.get(body.get('hash'))
+                return (200, torrent) if torrent else (404, None)
+        if path == '/viewed':
+            if action == 'list':
+                return 200, [{'hash': h, 'file_index': i} for h, i in sorted(self.viewed)
+                             if not body.get('hash') or h == body.get('hash')]
+            if action == 'set':
+                self.viewed.add((body.get('hash'), body.get('file_index')))
+                return 200, None
+        if path.startswith('/stream/'):
+            t_hash = parse_qs(urlsplit(path).query).get('link', [''])[0]
+            torrent = self.torrents.get(t_hash)
+            if not torrent:
+                return 404, None
+            files = [{'id': i, 'path': f'{torrent["title"]}/{i:02}.mkv', 'length': 1024 ** 3}
+                     for i in range(1, torrent['files'] + 1)]
+            return 200, {'hash': t_hash, 'title': torrent['title'], 'name': torrent['title'], 'file_stats': files}
+        return 404, None
+
+    # trackers
+
+    def tracker(self, url):
+        """Topic page, .torrent file or main page of tracker by absolute url"""
+        host = urlsplit(url).hostname
+        self._count(f'tracker {host}')
+        if self._failed():
+            return 503, 'text/html', b'Service Unavailable'
+        found = TorrentsSource.get_tracker_by_url(url=url)
+        if not found or (urlsplit(url).path in ('', '/')):
+            return 200, 'text/html', b'<html><body>main page</body></html>'
+        tracker_name_id, sep = found
+        tracker = tracker_name_id.replace('_id', '')
+        t_id = re.search(r'(\d+)(?:\.torrent)?/?$', url)
+        t_id = t_id.group(1) if t_id else ''
+        t_hash, title = self.topics.get((tracker, t_id), (f'{int(t_id or 0):040x}', f'Series {t_id}'))
+        if 'download' in url or url.endswith('.torrent'):
+            return 200, 'application/x-bittorrent', make_torrent_file(name=title, t_id=int(t_id or 0))
+        page = render_page(self._template(tracker), t_id=t_id, t_hash=t_hash, title=title, padding=self.padding)
+        return 200, 'text/html; charset=utf-8', page.encode('utf-8')
+
+    def _make_handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def log_message(self, *args):
+                pass
+
+            def _reply(self, status, content_type, body):
+                self.send_response(status)
+                self.send_header('Content-Type', content_type)
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                if self.command != 'HEAD':
+                    self.wfile.write(body)
+
+            def _handle(self):
+                length = int(self.headers.get('Content-Length') or 0)
+                raw_body = self.rfile.read(length) if length else b''
+                if self.path.startswith('http'):
+                    if server.tracker_latency:
+                        threading.Event().wait(server.tracker_latency)
+                    self._reply(*server.tracker(self.path))
+                    return
+                if server.torrserver_latency:
+                    threading.Event().wait(server.torrserver_latency)
+                try:
+                    body = json.loads(raw_body) if raw_body else dict()
+                except ValueError:
+                    body = dict()
+                with server._lock:
+                    status, result = server.torrserver(self.path, body)
+                self._reply(status, 'application/json', json.dumps(result).encode('utf-8') if result is not None
+                            else b'')
+
+            do_GET = _handle
+            do_POST = _handle
+            do_HEAD = _handle
+
+        return Handler
@@ -0,0 +1,168 @@
+#!/usr/bin/python3
+# -*- coding: utf-8 -*-
+# coding: utf8
+
+"""
+End-to-end tests of main() with local fake TorrServer and tracker fixtures,
+run as script for benchmark with libraries of 100, 1k and 10k torrents (or given sizes):
+PYTHONPATH=.:tests python tests/tests_for_end_to_end.py [100 1000 10000]
+"""
+
+
+import os
+import sys
+import json
+import time
+import logging
+import sqlite3
+import pytest
+from fake_server import FakeServer, load_fixture, render_page
+from series_updater import (main, TrackerPage, TorrentsSource, RuTor, NnmClub, TorrentBy, Rutracker, NewStudio,
+                            PiratBit)
+
+
+MAGNET_TRACKERS = [('rutor', RuTor), ('nnmclub', NnmClub), ('torrentby', TorrentBy), ('rutracker', Rutracker),
+                   ('newstudio', NewStudio), ('piratbit', PiratBit)]
+
+
+def run_main(server, cache_dir, *flags):
+    """Run updater against fake server, returns wall time"""
+    os.makedirs(cache_dir, exist_ok=True)
+    # fresh cached release check, github is not asked
+    with open(os.path.join(cache_dir, 'latest_release.json'), mode='w', encoding='utf-8') as release_file:
+        release_file.write('{}')
+    argv = sys.argv
+    sys.argv = ['series_updater.py', '--ts_url', 'http://127.0.0.1', '--ts_port', str(server.port),
+                '--proxy', server.url, '--cache_dir', str(cache_dir), '--rutor', *flags]
+    started = time.perf_counter()
+    try:
+        main()
+    finally:
+        sys.argv = argv
+    return time.perf_counter() - started
+
+
+@pytest.fixture(autouse=True)
+def hosts_health():
+    yield
+    # hosts marked as down here must not affect other tests
+    TorrentsSource._hosts_health.clear()
+
+
+@pytest.mark.parametrize('tracker, tracker_class', MAGNET_TRACKERS)
+def test_fixture_extractors(tracker, tracker_class):
+    text = render_page(load_fixture(tracker), t_id=7, t_hash='a' * 40, title='Series 7 [01-08 of 10]', padding=1)
+    page = TrackerPage(text=text)
+    assert tracker_class.get_title(page) == 'Series 7 [01-08 of 10]'
+    assert tracker_class.get_hash_from_magnet(magnet_link=tracker_class.get_magnet(page)) == 'a' * 40
+    assert tracker_class.get_poster(page).endswith('7.jpg')
+
+
+def test_main_updates_library(tmp_path):
+    with FakeServer(padding=4) as server:
+        server.add_library(count=40, updated=0.25)
+        updated = {t_id for (_, t_id), (t_hash, _) in server.topics.items() if t_hash != f'{int(t_id):040x}'}
+        run_main(server, tmp_path, '--workers', '4', '--stream')
+        hashes = set(server.torrents)
+    assert updated
+    assert {f'{int(t_id):040x}' for t_id in updated}.isdisjoint(hashes)
+    assert {f'{int(t_id):040x}'.replace('0', 'f') for t_id in updated} <= hashes
+    assert len(hashes) == 40
+    assert server.requests['torrserver /torrents add'] == len(updated)
+    assert server.requests['tracker rutor.info'] + server.requests['tracker rutor.is'] >= 40
+
+
+def test_main_page_cache_not_available(tmp_path):
+    # pages folder can not be created, run goes on without page cache
+    (tmp_path / 'pages').write_text('')
+    with FakeServer() as server:
+        server.add_library(count=10, updated=0.5)
+        run_main(server, tmp_path)
+        added = server.requests['torrserver /torrents add']
+    assert added
+
+
+def test_main_state_store_not_available(tmp_path):
+    # state database can not be opened, run goes on without recheck state
+    (tmp_path / 'state.sqlite3').mkdir()
+    with FakeServer() as server:
+        server.add_library(count=10, updated=0.5)
+        run_main(server, tmp_path, '--recheck_after', '60')
+        added = server.requests['torrserver /torrents add']
+    assert added
+
+
+def test_main_metrics_report(tmp_path):
+    with FakeServer() as server:
+        server.add_library(count=10, updated=0.5)
+        run_main(server, tmp_path, '--metrics_file', str(tmp_path / 'metrics.json'),
+                 '--metrics_textfile', str(tmp_path / 'updater.prom'))
+        added = server.requests['torrserver /torrents add']
+    with open(tmp_path / 'metrics.json', encoding='utf-8') as metrics_file:
+        report = json.load(metrics_file)
+    requests_by_host = dict()
+    for item in report['requests_total']:
+        host = item['labels']['host']
+        requests_by_host[host] = requests_by_host.get(host, 0) + item['value']
+    assert requests_by_host.get('rutor.info', 0) + requests_by_host.get('rutor.is', 0) >= 10
+    assert requests_by_host['127.0.0.1'] >= 2
+    assert {item['labels']['source'] for item in report['parse_duration_seconds']} == {'RuTor'}
+    assert report['run_duration_seconds'][0]['value'] > 0
+    with open(tmp_path / 'updater.prom', encoding='utf-8') as prom_file:
+        assert 'ts_series_updater_topics_total{result="checked",tracker="rutor_id"}' in prom_file.read()
+    assert added
+
+
+def test_main_profile(tmp_path):
+    with FakeServer() as server:
+        server.add_library(count=10, updated=0.5)
+        run_main(server, tmp_path, '--workers', '2', '--profile', str(tmp_path / 'profile'))
+    with open(tmp_path / 'profile' / 'trace.json', encoding='utf-8') as trace_file:
+        events = json.load(trace_file)['traceEvents']
+    phases = {(e['cat'], e['name']) for e in events if e['ph'] == 'X'}
+    assert {('torrserver', 'torrents list'), ('torrserver', '_raw2struct'), ('tracker', 'rutor_id'),
+            ('fetch', 'RuTor'), ('parse', 'RuTor'), ('plan', 'plan_tracker_torrent'), ('apply', 'apply_plan'),
+            ('cleanup', 'delete_torrents'), ('http', '127.0.0.1')} <= phases
+    assert (tmp_path / 'profile' / 'profile.pstats').exists()
+
+
+def test_main_dry_run(tmp_path, caplog):
+    with FakeServer() as server:
+        server.add_library(count=20, updated=0.5)
+        before = set(server.torrents)
+        with caplog.at_level(logging.INFO):
+            run_main(server, tmp_path, '--dry_run', '--workers', '4')
+        after = set(server.torrents)
+    updated = sum(1 for (_, t_id), (t_hash, _) in server.topics.items() if t_hash != f'{int(t_id):040x}')
+    assert updated
+    assert before == after
+    assert not server.requests['torrserver /torrents add'] and not server.requests['torrserver /torrents rem']
+    assert f'Plan: {updated} torrents to add, {updated} to remove' in caplog.messages
+    # local state is not changed by dry run either
+    assert not list((tmp_path / 'pages').glob('*.json'))
+    with sqlite3.connect(tmp_path / 'state.sqlite3') as conn:
+        assert conn.execute('SELECT COUNT(*) FROM topics').fetchone()[0] == 0
+
+
+def test_main_tracker_errors(tmp_path):
+    with FakeServer(error_rate=1.0) as server:
+        server.add_library(count=10)
+        run_main(server, tmp_path, '--workers', '2')
+    assert not server.requests['torrserver /torrents add']
+    # circuit breaker stops requests after a few failures
+    assert server.requests['tracker rutor.info'] + server.requests['tracker rutor.is'] < 10 * 3
+
+
+if __name__ == '__main__':
+    import tempfile
+    logging.basicConfig(level=logging.WARNING)
+    for count in [int(arg) for arg in sys.argv[1:]] or (100, 1000, 10000):
+        with FakeServer(tracker_latency=0.02, padding=16) as server, tempfile.TemporaryDirectory() as cache_dir:
+            server.add_library(count=count, updated=0.1)
+            wall_time = run_main(server, cache_dir, '--stream')
+            tracker_requests = sum(v for k, v in server.requests.items() if k.startswith('tracker'))
+            torrserver_requests = sum(v for k, v in server.requests.items() if k.startswith('torrserver'))
+            print(f'{count:>6} torrents: {wall_time:7.2f} s, tracker requests {tracker_requests}, '
+                  f'TorrServer requests {torrserver_requests}')
+            for key, value in sorted(server.requests.items()):
+                print(f'        {key}: {value}')
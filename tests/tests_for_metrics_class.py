@@ -0,0 +1,78 @@
+#!/usr/bin/python3
+# -*- coding: utf-8 -*-
+# coding: utf8
+
+"""
+Tests for Metrics
+"""
+
+
+import json
+import requests
+from series_updater import Metrics, METRICS, TorrentsSource
+
+
+def test_counters_and_histogram():
+    metrics = Metrics()
+    metrics.count('requests_total', host='rutor.info', status=200)
+    metrics.count('requests_total', host='rutor.info', status=200)
+    metrics.count('response_bytes_total', 1024, host='rutor.info')
+    for latency in (0.01, 0.2, 100):
+        metrics.observe('request_duration_seconds', latency, host='rutor.info')
+    assert metrics.get('requests_total', host='rutor.info', status=200) == 2
+    assert metrics.get('requests_total', host='rutor.info', status=404) is None
+    report = metrics.to_dict()
+    assert report['response_bytes_total'] == [{'labels': {'host': 'rutor.info'}, 'value': 1024}]
+    histogram = report['request_duration_seconds'][0]
+    assert histogram['count'] == 3
+    assert histogram['buckets']['0.05'] == 1
+    assert histogram['buckets']['0.25'] == 2
+    assert histogram['buckets']['30'] == 2
+    assert histogram['buckets']['+Inf'] == 3
+
+
+def test_prometheus_exposition():
+    metrics = Metrics()
+    metrics.count('requests_total', host='nnmclub.to', status='error')
+    metrics.observe('parse_duration_seconds', 0.003, source='RuTor')
+    metrics.set('run_duration_seconds', 1.5)
+    text = metrics.to_prometheus()
+    assert '# TYPE ts_series_updater_requests_total counter' in text
+    assert 'ts_series_updater_requests_total{host="nnmclub.to",status="error"} 1' in text
+    assert 'ts_series_updater_parse_duration_seconds_bucket{source="RuTor",le="0.0025"} 0' in text
+    assert 'ts_series_updater_parse_duration_seconds_bucket{source="RuTor",le="0.005"} 1' in text
+    assert 'ts_series_updater_parse_duration_seconds_bucket{source="RuTor",le="+Inf"} 1' in text
+    assert 'ts_series_updater_parse_duration_seconds_count{source="RuTor"} 1' in text
+    assert 'ts_series_updater_run_duration_seconds 1.5' in text
+    assert text.endswith('\n')
+
+
+def test_write_and_serve(tmp_path):
+    metrics = Metrics()
+    metrics.count('torrents_added_total')
+    metrics.write(json_path=str(tmp_path / 'metrics.json'), textfile_path=str(tmp_path / 'prom' / 'updater.prom'))
+    with open(tmp_path / 'metrics.json', encoding='utf-8') as json_file:
+        assert json.load(json_file) == {'torrents_added_total': [{'labels': {}, 'value': 1}]}
+    with open(tmp_path / 'prom' / 'updater.prom', encoding='utf-8') as prom_file:
+        assert 'ts_series_updater_torrents_added_total 1' in prom_file.read()
+    assert sorted(p.name for p in tmp_path.iterdir()) == ['metrics.json', 'prom']
+    server = metrics.serve(port=0, host='127.0.0.1')
+    try:
+        url = f'http://127.0.0.1:{server.server_address[1]}'
+        resp = requests.get(f'{url}/metrics', timeout=5)
+        assert resp.status_code == 200
+        assert 'ts_series_updater_torrents_added_total 1' in resp.text
+        assert requests.get(f'{url}/other', timeout=5).status_code == 404
+    finally:
+        metrics.stop()
+
+
+def test_server_request_metrics(requests_mock):
+    requests_mock.get('http://metrics.test/page', [{'status_code': 503}, {'text': 'x' * 100}])
+    before = METRICS.get('response_bytes_total', host='metrics.test') or 0
+    TorrentsSource(retry_backoff=0)._server_request(url='http://metrics.test/page')
+    assert METRICS.get('requests_total', host='metrics.test', status=503) >= 1
+    assert METRICS.get('requests_total', host='metrics.test', status=200) >= 1
+    assert METRICS.get('response_bytes_total', host='metrics.test') - before == 100
+    assert METRICS.get('request_duration_seconds', host='metrics.test')['count'] >= 2
+
@@ -0,0 +1,89 @@
+#!/usr/bin/python3
+# -*- coding: utf-8 -*-
+# coding: utf8
+
+"""
+Micro-benchmarks of tracker pages extractors and TorrServer list parsing, needs pytest-benchmark:
+python -m pytest tests/tests_for_parsers_benchmark.py --benchmark-storage=tests/benchmarks
+    --benchmark-compare=0001 --benchmark-compare-fail=min:25%
+fails, if min time of any benchmark is 25% worse than saved baseline (min is less noisy than mean),
+save new baseline after intended changes with --benchmark-save=baseline.
+Pages are tests/fixtures, padded to the size of real topic pages.
+"""
+
+
+import json
+import pytest
+pytest.importorskip('pytest_benchmark')
+from fake_server import load_fixture, render_page  # noqa: E402
+from series_updater import (TRACKERS_BY_HOST, TrackerPage, TorrentsSource, TorrServer, RuTor, NnmClub,  # noqa: E402
+                            Rutracker, Kinozal, NewStudio, PiratBit, AniDub, AniLibria, RUTOR)
+
+# page size close to real topic pages with description and comments, KB
+PADDING = 64
+MAGNET = f'magnet:?xt=urn:btih:{"ab" * 20}&dn=rutor.info&tr=udp://opentor.net:6969'
+EXTRACTORS = [(tracker, tracker_class, extractor)
+              for tracker, tracker_class in [('rutor', RuTor), ('nnmclub', NnmClub), ('rutracker', Rutracker),
+                                             ('newstudio', NewStudio), ('piratbit', PiratBit)]
+              for extractor in ('get_title', 'get_magnet', 'get_poster')]
+# magnet of these trackers is taken from .torrent file, links to files are extracted from page
+EXTRACTORS += [(tracker, tracker_class, extractor)
+               for tracker, tracker_class in [('kinozal', Kinozal), ('anidub', AniDub), ('anilibria', AniLibria)]
+               for extractor in ('get_title', 'get_poster', 'file_links')]
+
+
+def fixture_text(tracker):
+    return render_page(load_fixture(tracker), t_id=12345, t_hash='ab' * 20, title='Series [01-08 of 10]',
+                       padding=PADDING)
+
+
+@pytest.mark.parametrize('tracker, tracker_class, extractor', EXTRACTORS,
+                         ids=[f'{tracker}-{extractor}' for tracker, _, extractor in EXTRACTORS])
+def test_extractor(benchmark, tracker, tracker_class, extractor):
+    """Extractor on page text, page parsing included"""
+    text = fixture_text(tracker)
+    if extractor == 'file_links':
+        result = benchmark(lambda: TrackerPage(text=text).xpath(tracker_class.file_links_xpath))
+    else:
+        result = benchmark(getattr(tracker_class, extractor), text)
+    assert result
+
+
+@pytest.mark.parametrize('tracker, tracker_class', [('rutor', RuTor), ('nnmclub', NnmClub), ('rutracker', Rutracker),
+                                                    ('newstudio', NewStudio), ('piratbit', PiratBit)])
+def test_page_all_values(benchmark, tracker, tracker_class):
+    """Page parsed once, all values extracted, as in update flow"""
+    text = fixture_text(tracker)
+
+    def extract():
+        page = TrackerPage(text=text)
+        return tracker_class.get_title(page), tracker_class.get_magnet(page), tracker_class.get_poster(page)
+
+    assert all(benchmark(extract))
+
+
+def test_get_hash_from_magnet(benchmark):
+    assert benchmark(TorrentsSource.get_hash_from_magnet, MAGNET) == 'ab' * 20
+
+
+def test_is_tracker_link(benchmark):
+    url = 'https://rutor.is/torrent/123456/series-s01'
+    assert benchmark(TorrentsSource.is_tracker_link, url, RUTOR['rutor_id'], '/') == '123456'
+
+
+def test_get_tracker_by_url(benchmark):
+    url = 'https://www.kinozal.guru/details.php?id=123456'
+    assert benchmark(TorrentsSource.get_tracker_by_url, url, TRACKERS_BY_HOST) == ('kinozal_id', '=')
+
+
+def test_raw2struct_50k(benchmark, requests_mock):
+    urls = ['http://rutor.info/torrent/{}', 'https://nnmclub.to/forum/viewtopic.php?t={}',
+            'https://kinozal.tv/details.php?id={}', 'https://rutracker.org/forum/viewtopic.php?t={}',
+            'https://example.com/topic/{}']
+    items = [{'hash': f'{i:040x}', 'title': f'Series {i}', 'poster': '', 'timestamp': i, 'stat': 3,
+              'stat_string': 'Torrent working', 'torrent_size': i,
+              'data': json.dumps({'TSA': {'srcUrl': urls[i % len(urls)].format(i)}})} for i in range(50000)]
+    requests_mock.post('http://127.0.0.1:8090/torrents', json=items)
+    torrserver = TorrServer(ts_url='http://127.0.0.1', ts_port=8090)
+    benchmark.pedantic(torrserver._raw2struct, setup=torrserver.torrents_list.clear, rounds=5)
+    assert len(torrserver.torrents_list) == 40000
@@ -0,0 +1,62 @@
+#!/usr/bin/python3
+# -*- coding: utf-8 -*-
+# coding: utf8
+
+"""
+Tests for Profiler
+"""
+
+
+import json
+import pstats
+import threading
+from series_updater import Profiler
+
+
+def busy_worker():
+    return sum(i * i for i in range(10000))
+
+
+def test_spans_off_until_started():
+    profiler = Profiler()
+
+    @profiler.traced('parse')
+    def parse():
+        return 1
+
+    with profiler.span('rutor.info', 'http') as span_args:
+        span_args['status'] = 200
+    assert parse() == 1
+    assert profiler.trace()['traceEvents'] == []
+
+
+def test_profile_and_trace(tmp_path):
+    profiler = Profiler()
+
+    @profiler.traced('torrserver', name='torrents list')
+    def torrents_list():
+        return list(range(10))
+
+    profiler.start()
+    try:
+        assert torrents_list() == list(range(10))
+        with profiler.span('rutor.info', 'http', url='http://rutor.info/torrent/1') as span_args:
+            span_args['status'] = 200
+        worker = threading.Thread(target=busy_worker, name='worker')
+        worker.start()
+        worker.join()
+    finally:
+        profiler.stop(folder=str(tmp_path))
+    with open(tmp_path / 'trace.json', encoding='utf-8') as trace_file:
+        events = json.load(trace_file)['traceEvents']
+    spans = {(e['cat'], e['name']): e for e in events if e['ph'] == 'X'}
+    assert set(spans) == {('torrserver', 'torrents list'), ('http', 'rutor.info')}
+    assert spans[('http', 'rutor.info')]['args'] == {'url': 'http://rutor.info/torrent/1', 'status': '200'}
+    assert spans[('http', 'rutor.info')]['ts'] >= spans[('torrserver', 'torrents list')]['ts']
+    assert {e['args']['name'] for e in events if e['ph'] == 'M'} == {threading.current_thread().name}
+    # worker threads are profiled too
+    functions = {func for _, _, func in pstats.Stats(str(tmp_path / 'profile.pstats')).stats}
+    assert {'busy_worker', 'torrents_list'} <= functions
+    assert (tmp_path / 'profile.txt').exists()
+    assert profiler.breakdown()[0].startswith('Profile: ')
+    assert not profiler.enabled
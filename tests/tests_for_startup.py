@@ -0,0 +1,63 @@
+#!/usr/bin/python3
+# -*- coding: utf-8 -*-
+# coding: utf8
+
+"""
+Startup time checks, run as script to print import time benchmark:
+python tests/tests_for_startup.py
+"""
+
+
+import os
+import sys
+import tempfile
+import statistics
+import subprocess
+
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# own import time of series_updater, without requests and yarl and with cached bytecode:
+# about 7 ms, it was 28 ms before heavy imports were deferred
+IMPORT_TIME_LIMIT = 0.02
+
+
+def run_python(code, env=None):
+    return subprocess.run([sys.executable, '-c', code], cwd=ROOT, capture_output=True, text=True, check=True,
+                          env=env).stdout
+
+
+def measure_import_time(runs=5):
+    """Import time of series_updater itself, its dependencies are imported before, bytecode is compiled once"""
+    code = ('import time, requests, yarl\n'
+            't = time.perf_counter()\n'
+            'import series_updater\n'
+            'print(time.perf_counter() - t)')
+    with tempfile.TemporaryDirectory() as pycache:
+        env = dict(os.environ, PYTHONPYCACHEPREFIX=pycache)
+        env.pop('PYTHONDONTWRITEBYTECODE', None)
+        run_python(code, env=env)
+        return [float(run_python(code, env=env)) for _ in range(runs)]
+
+
+def test_heavy_modules_not_imported():
+    code = ('import sys, series_updater\n'
+            'print(",".join(m for m in ("yaml", "bencodepy", "lxml", "sqlite3") if m in sys.modules))')
+    assert run_python(code).strip() == ''
+
+
+def test_args_parsed_once():
+    code = ('import sys, series_updater\n'
+            'sys.argv = ["series_updater.py", "--all"]\n'
+            'parser = series_updater.ArgsParser(desc="")\n'
+            'print(parser.args is parser.args, parser.args.rutor, parser.args.piratbit)')
+    assert run_python(code).strip() == 'True True True'
+
+
+def test_import_time():
+    assert statistics.median(measure_import_time(runs=3)) < IMPORT_TIME_LIMIT
+
+
+if __name__ == '__main__':
+    timings = measure_import_time(runs=10)
+    print(f'import series_updater without dependencies: median {statistics.median(timings) * 1000:.1f} ms, '
+          f'min {min(timings) * 1000:.1f} ms, max {max(timings) * 1000:.1f} ms')
@@ -0,0 +1,88 @@
+#!/usr/bin/python3
+# -*- coding: utf-8 -*-
+# coding: utf8
+
+"""
+Tests for TorrentFile, run as script to print benchmark against bencodepy:
+PYTHONPATH=. python tests/tests_for_torrent_file_class.py
+"""
+
+
+import hashlib
+import timeit
+import pytest
+from series_updater import TorrentFile, bencode_end
+
+
+def bencode(value):
+    if isinstance(value, int):
+        return f'i{value}e'.encode()
+    if isinstance(value, str):
+        value = value.encode('utf-8')
+    if isinstance(value, bytes):
+        return f'{len(value)}:'.encode() + value
+    if isinstance(value, list):
+        return b'l' + b''.join(bencode(v) for v in value) + b'e'
+    return b'd' + b''.join(bencode(k) + bencode(v) for k, v in value.items()) + b'e'
+
+
+def make_torrent(files=3, name='Series S01'):
+    info = {'files': [{'length': 1000 + i, 'path': ['Season 1', f'Episode {i:03}.mkv']} for i in range(files)],
+            'name': name, 'piece length': 262144, 'pieces': b'\x00' * 20 * files}
+    return bencode({'announce': 'http://tr.example/ann', 'info': info}), bencode(info)
+
+
+def test_torrent_file_values():
+    content, info = make_torrent()
+    tf = TorrentFile(file_content=content)
+    assert tf.get_hash() == hashlib.sha1(info).hexdigest()
+    assert tf.get_name() == 'Series S01'
+    assert tf.get_announce() == 'http://tr.example/ann'
+    assert tf.get_files_list()[2] == {'path': 'Season 1/Episode 002.mkv', 'length': 1002}
+
+
+def test_torrent_file_non_canonical_and_broken():
+    # keys not sorted: hash must be taken from original bytes, not from re-encoded dict
+    info = b'd4:name1:x6:lengthi5ee'
+    tf = TorrentFile(file_content=b'd4:info' + info + b'8:announce0:e')
+    assert tf.get_hash() == hashlib.sha1(info).hexdigest()
+    assert tf.get_files_list() == [{'path': 'x', 'length': 5}]
+    broken = TorrentFile(file_content=b'd4:infod4:name10:xe')
+    assert broken.get_hash() is None
+    assert broken.get_name() is None
+    assert TorrentFile(file_content=b'<html>').get_files_list() == list()
+    with pytest.raises(ValueError):
+        bencode_end(b'5:abc')
+
+
+@pytest.mark.parametrize('content', [b'd-3:e', b'd4:infod-4:namee', b'd4:infod4:name-1:xee', b'd 1:xe', b'l+1:xe',
+                                     b'd4:infod4:name\xd9\xa3:xyzee', b'e'])
+def test_torrent_file_malformed(content):
+    # negative or not ascii digits lengths must not move scanning backwards or hang
+    tf = TorrentFile(file_content=content)
+    assert tf.get_hash() is None
+    assert tf.get_files_list() == list()
+    with pytest.raises((ValueError, IndexError)):
+        bencode_end(content)
+
+
+def test_hash_same_as_bencodepy():
+    bencodepy = pytest.importorskip('bencodepy')
+    content, _ = make_torrent(files=50)
+    info = bencodepy.decode(content)[b'info']
+    assert TorrentFile(file_content=content).get_hash() == hashlib.sha1(bencodepy.encode(info)).hexdigest()
+
+
+if __name__ == '__main__':
+    import bencodepy
+
+    def bencodepy_hash(content):
+        return hashlib.sha1(bencodepy.encode(bencodepy.decode(content)[b'info'])).hexdigest()
+
+    for files in (10, 1000, 10000):
+        content, _ = make_torrent(files=files)
+        runs = max(1, 10000 // files)
+        scanner = timeit.timeit(lambda: TorrentFile(file_content=content).get_hash(), number=runs) / runs
+        decoder = timeit.timeit(lambda: bencodepy_hash(content), number=runs) / runs
+        print(f'{files:>6} files, {len(content) // 1024:>5} KB: scanner {scanner * 1000:8.3f} ms, '
+              f'bencodepy {decoder * 1000:8.3f} ms, x{decoder / scanner:.1f}')
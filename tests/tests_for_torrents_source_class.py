@@ -12,7 +12,7 @@ Tests for TorrentsSource
 import pytest
 import requests
 # import requests_mock
-from series_updater import TorrentsSource
+from series_updater import TorrentsSource, TorrServer, TokenBucket, HostHealth
 from requests import HTTPError
 
 
@@ -28,3 +28,92 @@ def test_server_request_get_ok(requests_mock):
     ts_obj = TorrentsSource(server_url='http://localhost')
     resp = ts_obj._server_request(r_type='get', pref='test_get')
     assert {'test': 'ok', 'code': 200} == resp.json()
+
+
+def test_server_request_retry_transient(requests_mock):
+    requests_mock.get('http://localhost/retry', [{'status_code': 503}, {'exc': requests.ConnectionError},
+                                                 {'json': {'test': 'ok'}}])
+    ts_obj = TorrentsSource(retry_backoff=0)
+    resp = ts_obj._server_request(r_type='get', url='http://localhost/retry')
+    assert resp.json() == {'test': 'ok'}
+    assert requests_mock.call_count == 3
+
+
+def test_server_request_no_retry(requests_mock):
+    requests_mock.get('http://localhost/missing', status_code=404)
+    requests_mock.post('http://localhost/post', status_code=503)
+    ts_obj = TorrentsSource(retry_backoff=0)
+    assert ts_obj._server_request(r_type='get', url='http://localhost/missing').status_code == 404
+    assert ts_obj._server_request(r_type='post', url='http://localhost/post').status_code == 503
+    assert requests_mock.call_count == 2
+
+
+def test_token_bucket_rate():
+    bucket = TokenBucket(rate=50, capacity=2)
+    waited = [bucket.acquire() for _ in range(6)]
+    assert waited[:2] == [0, 0]
+    assert sum(waited) == pytest.approx(4 / 50, abs=0.03)
+
+
+def test_host_health_timeout_and_circuit():
+    health = HostHealth(failures_limit=3, reset_after=60)
+    assert health.get_timeout(10) == 10
+    for latency in (0.5, 0.6, 0.7, 0.8, 2.0):
+        health.record(ok=True, latency=latency)
+    assert health.get_timeout(10) == 6.0
+    for _ in range(3):
+        health.record(ok=False, now=100)
+    assert health.get_timeout(10) == 10
+    assert health.is_down(now=150)
+    assert not health.is_down(now=160)
+    # only one probe request while circuit is half open
+    assert health.is_down(now=160)
+    health.record(ok=False, now=160)
+    assert health.is_down(now=161)
+    assert not health.is_down(now=220)
+    assert health.is_down(now=221)
+    health.record(ok=True, latency=0.5)
+    assert not health.is_down(now=222)
+    assert not health.is_down(now=222)
+
+
+def test_server_request_host_down(requests_mock):
+    requests_mock.get('http://down.example/topic', exc=requests.ConnectTimeout)
+    ts_obj = TorrentsSource(retries=0)
+    for _ in range(TorrentsSource.circuit_failures):
+        assert ts_obj._server_request(r_type='get', url='http://down.example/topic').status_code == 520
+    assert ts_obj._server_request(r_type='get', url='http://down.example/topic') is ts_obj.host_down_response
+    assert requests_mock.call_count == TorrentsSource.circuit_failures
+
+
+def test_session_pool_size():
+    ts_obj = TorrentsSource(host_limit=12)
+    adapter = ts_obj._session.get_adapter('https://tracker.example/')
+    assert ts_obj.pool_size == 12
+    assert adapter._pool_maxsize == 12
+
+
+def test_server_request_http2():
+    httpx = pytest.importorskip('httpx')
+    pytest.importorskip('h2')
+    ts_obj = TorrentsSource(http2=True)
+    assert ts_obj._http2_client is not None
+    ts_obj._http2_client = httpx.Client(transport=httpx.MockTransport(
+        lambda request: httpx.Response(200, json={'method': request.method})))
+    resp = ts_obj._server_request(r_type='post', url='https://h2.example/post', data={'a': 1}, is_json=True)
+    assert resp.json() == {'method': 'POST'}
+    assert resp
+    ts_obj._http2_client = httpx.Client(transport=httpx.MockTransport(lambda request: httpx.Response(404)))
+    assert not ts_obj._server_request(r_type='get', url='https://h2.example/missing')
+
+
+def test_http2_only_for_https(requests_mock):
+    httpx = pytest.importorskip('httpx')
+    pytest.importorskip('h2')
+    ts_obj = TorrentsSource(http2=True)
+    ts_obj._http2_client = httpx.Client(transport=httpx.MockTransport(lambda request: httpx.Response(500)))
+    requests_mock.get('http://plain.example/page', text='ok')
+    assert ts_obj._server_request(r_type='get', url='http://plain.example/page').text == 'ok'
+    requests_mock.post('http://127.0.0.1:8090/torrents', json=[])
+    torrserver = TorrServer(ts_url='http://127.0.0.1', ts_port=8090, http2=True)
+    assert torrserver._http2_client is None
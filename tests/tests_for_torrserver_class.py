@@ -0,0 +1,108 @@
+#!/usr/bin/python3
+# -*- coding: utf-8 -*-
+# coding: utf8
+
+"""
+Tests for TorrServer
+"""
+
+
+import json
+import requests
+from series_updater import TorrServer, UpdatePlan, PlannedUpdate
+
+
+def ts_item(t_hash, data):
+    return {'hash': t_hash, 'title': f'title {t_hash}', 'poster': '', 'timestamp': 0, 'stat': 0, 'stat_string': '',
+            'torrent_size': 0, 'data': data}
+
+
+def get_torrserver(requests_mock, items):
+    requests_mock.post('http://127.0.0.1:8090/torrents', json=items)
+    return TorrServer(ts_url='http://127.0.0.1', ts_port=8090)
+
+
+def test_raw2struct_trackers(requests_mock):
+    items = [ts_item('1' * 40, json.dumps({'TSA': {'srcUrl': 'http://rutor.info/torrent/123'}})),
+             ts_item('2' * 40, json.dumps({'TSA': {'srcUrl': 'https://www.kinozal.guru/details.php?id=77&s=1'}})),
+             ts_item('3' * 40, json.dumps({'TSA': {'srcUrl': 'https://anidub.com/anime/x.html'}})),
+             ts_item('4' * 40, json.dumps({'TSA': {'srcUrl': 'https://example.com/topic/1'}})),
+             ts_item('5' * 40, 'http://rutor.is/torrent/456'),
+             ts_item('6' * 40, None)]
+    torrserver = get_torrserver(requests_mock, items)
+    by_hash = {t['t_hash']: t for t in torrserver.torrents_list}
+    assert len(torrserver.torrents_list) == 4
+    assert by_hash['1' * 40]['rutor_id'] == '123'
+    assert by_hash['2' * 40]['kinozal_id'] == '77'
+    assert by_hash['3' * 40]['anidub_id'] == 'https://anidub.com/anime/x.html'
+    assert by_hash['5' * 40]['rutor_id'] == '456'
+
+
+def test_litrcc_torrents(requests_mock):
+    items = [ts_item('1' * 40, json.dumps({'LITRCC': {'external_url': 'http://rutor.info/torrent/123'}})),
+             ts_item('2' * 40, json.dumps({'TSA': {'srcUrl': 'http://rutor.info/torrent/123'}})),
+             ts_item('3' * 40, json.dumps([1, 2]))]
+    torrserver = get_torrserver(requests_mock, items)
+    torrserver.get_litrcc_torrents()
+    assert [t['t_hash'] for t in torrserver.litrcc_torrents_list] == ['1' * 40]
+    assert [t['t_hash'] for t in torrserver.torrents_list] == ['2' * 40]
+    assert list(torrserver.litrcc_torrents_index) == ['http://rutor.info/torrent/123']
+
+
+def test_apply_plan_viewed(requests_mock):
+    torrserver = get_torrserver(requests_mock, [])
+    requests_mock.post('http://127.0.0.1:8090/viewed', json=[{'hash': 'a' * 40, 'file_index': 1},
+                                                             {'hash': 'a' * 40, 'file_index': 2},
+                                                             {'hash': 'b' * 40, 'file_index': 3},
+                                                             {'hash': 'c' * 40, 'file_index': 4}])
+    indexes = torrserver.get_viewed_indexes(hashes=['a' * 40, 'b' * 40])
+    assert indexes == {1, 2, 3}
+    plan = UpdatePlan()
+    plan.add_update(PlannedUpdate(source='RuTor', topic_id='1', title='Series',
+                                  torrent={'hash': 'd' * 40, 'title': 'Series'}, viewed=frozenset(indexes)))
+    requests_mock.post('http://127.0.0.1:8090/torrents', json={})
+    assert torrserver.apply_plan(plan) == 1
+    viewed_sets = [r.json() for r in requests_mock.request_history
+                   if r.path == '/viewed' and r.json().get('action') == 'set']
+    assert sorted(v['file_index'] for v in viewed_sets) == [1, 2, 3]
+    assert len([r for r in requests_mock.request_history if r.path == '/viewed']) == 4
+    assert torrserver.get_viewed_indexes(hashes=['d' * 40]) == {1, 2, 3}
+
+
+def test_cleanup_hashes_all_trackers(requests_mock):
+    items = [ts_item('1' * 40, json.dumps({'TSA': {'srcUrl': 'http://rutor.info/torrent/1'}})),
+             ts_item('2' * 40, json.dumps({'TSA': {'srcUrl': 'http://rutor.is/torrent/1'}})),
+             ts_item('3' * 40, json.dumps({'TSA': {'srcUrl': 'https://nnmclub.to/forum/viewtopic.php?t=5'}})),
+             ts_item('4' * 40, json.dumps({'TSA': {'srcUrl': 'https://nnmclub.to/forum/viewtopic.php?t=5'}})),
+             ts_item('5' * 40, json.dumps({'LITRCC': {'external_url': 'https://kinozal.tv/details.php?id=7'}})),
+             ts_item('6' * 40, json.dumps({'LITRCC': {'external_url': 'https://kinozal.tv/details.php?id=7'}})),
+             ts_item('7' * 40, json.dumps({'TSA': {'srcUrl': 'https://rutracker.org/forum/viewtopic.php?t=8'}}))]
+    torrserver = get_torrserver(requests_mock, items)
+    for t_hash, files in (('1', 3), ('2', 4), ('3', 5), ('4', 2), ('5', 1), ('6', 6)):
+        requests_mock.get(f'http://127.0.0.1:8090/stream/fname?link={t_hash * 40}&stat',
+                          json={'title': t_hash, 'file_stats': [{}] * files})
+    requests_mock.post('http://127.0.0.1:8090/torrents', [{'json': {}}] * 3 + [{'status_code': 404}] * 3)
+    plan = UpdatePlan()
+    plan.remove(hashes=torrserver.get_cleanup_hashes(), reason='duplicate with fewer files')
+    torrserver.apply_plan(plan)
+    removed = [r.json()['hash'] for r in requests_mock.request_history
+               if r.path == '/torrents' and r.json().get('action') == 'rem']
+    assert sorted(removed) == ['1' * 40, '4' * 40, '5' * 40]
+
+
+def test_stat_timeouts_do_not_stop_requests(requests_mock):
+    torrserver = get_torrserver(requests_mock, [])
+    for t_hash in ('1', '2', '3', '4', '5', '6'):
+        requests_mock.get(f'http://127.0.0.1:8090/stream/fname?link={t_hash * 40}&stat', exc=requests.ConnectTimeout)
+    for t_hash in ('1', '2', '3', '4', '5', '6'):
+        assert torrserver.get_torrent_stat(t_hash=t_hash * 40).status_code == 520
+    requests_mock.post('http://127.0.0.1:8090/torrents', json={})
+    assert torrserver.add_torrent(torrent={'hash': 'a' * 40}).status_code == 200
+
+
+def test_stat_not_retried(requests_mock):
+    torrserver = get_torrserver(requests_mock, [])
+    requests_mock.get(f'http://127.0.0.1:8090/stream/fname?link={"1" * 40}&stat', exc=requests.ReadTimeout)
+    calls = requests_mock.call_count
+    assert torrserver.get_torrent_stat(t_hash='1' * 40).status_code == 520
+    assert requests_mock.call_count - calls == 1
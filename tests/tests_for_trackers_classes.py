@@ -0,0 +1,237 @@
+#!/usr/bin/python3
+# -*- coding: utf-8 -*-
+# coding: utf8
+
+"""
+Tests for tracker classes extractors
+"""
+
+
+import time
+import requests
+from series_updater import (TrackerPage, TorrentsSource, RuTor, Rutracker, Kinozal, AniDub, AniLibria, TorrentBy,
+                            TorrentFile, PiratBit, LitrCC, METRICS)
+
+
+MAGNET = 'magnet:?xt=urn:btih:0123456789abcdef0123456789abcdef01234567'
+
+
+def free_slots(semaphore):
+    slots = 0
+    while semaphore.acquire(blocking=False):
+        slots += 1
+    for _ in range(slots):
+        semaphore.release()
+    return slots
+
+
+def test_rutor_extractors():
+    text = ('<html><body><h1>Series\n[01-02 of 10]</h1>'
+            f'<div id="download"><a href="{MAGNET[:20] + MAGNET[20:].upper()}">m</a></div>'
+            '<br /><img src="http://img.example/poster.jpg"></body></html>')
+    page = TrackerPage(text=text)
+    assert RuTor.get_title(page) == 'Series[01-02 of 10]'
+    assert RuTor.get_magnet(page) == MAGNET
+    assert RuTor.get_poster(page) == 'http://img.example/poster.jpg'
+    assert RuTor.get_title(text) == RuTor.get_title(page)
+
+
+def test_torrentby_magnet():
+    page = TrackerPage(text=f'<table><tr><td><a href="{MAGNET}">m</a></td></tr></table>')
+    assert TorrentBy.get_magnet(page) == MAGNET
+
+
+def test_rutracker_extractors():
+    text = ('<h1 class="maintitle"><a id="topic-title">Series <b>S01</b></a></h1>'
+            f'<table><tr><td><a class="magnet-link" href="{MAGNET}">m</a></td></tr></table>'
+            '<var class="postImg postImgAligned img-right" title="http://img.example/p.jpg"></var>')
+    page = TrackerPage(text=text)
+    assert Rutracker.get_title(page) == 'Series S01'
+    assert Rutracker.get_magnet(page) == MAGNET
+    assert Rutracker.get_poster(page) == 'http://img.example/p.jpg'
+
+
+def test_kinozal_poster():
+    text = ('<html><head><meta property="og:title" content="Series"><meta property="og:image" content="/i/p.jpg">'
+            '</head><body><div class="logo_new"><a href="https://kinozal.guru">k</a></div></body></html>')
+    page = TrackerPage(text=text)
+    assert Kinozal.get_title(page) == 'Series'
+    assert Kinozal.get_poster(page) == 'https://kinozal.guru/i/p.jpg'
+
+
+def test_kinozal_failover_login_out_of_mirrors_lock(requests_mock):
+    locked = list()
+
+    def login(request, context):
+        locked.append(TorrentsSource._mirrors_lock.locked())
+        return '<html><body></body></html>'
+
+    for mirror in Kinozal.mirrors:
+        requests_mock.post(f'https://{mirror}/takelogin.php', text=login)
+    kinozal = Kinozal(secrets={'kinozal_id': {'user': 'password'}}, retries=0)
+    failed = type('obj', (object,), {'status_code': 503})
+    assert kinozal.failover(resp=failed, url=kinozal.get_topic_url(torrent_id=1))
+    assert kinozal.mirror == Kinozal.mirrors[1]
+    assert requests_mock.last_request.url == f'https://{Kinozal.mirrors[1]}/takelogin.php'
+    assert locked and not any(locked)
+
+
+def test_anilibria_poster_absolute():
+    page = TrackerPage(text='<html><body><img class="detail_torrent_pic" src="/upload/p.jpg"></body></html>',
+                       url='https://anilibria.tv/release/x.html')
+    assert AniLibria.get_poster(page) == 'https://anilibria.tv/upload/p.jpg'
+
+
+def test_rutor_read_page_stream(requests_mock):
+    text = (f'<html><body><h1>Series</h1><div id="download"><a href="{MAGNET}">m</a></div>'
+            '<br /><img src="http://img.example/poster.jpg">' + '<p>comment</p>' * 20000 + '</body></html>')
+    requests_mock.get('http://rutor.info/torrent/1', content=text.encode('utf-8'),
+                      headers={'Content-Type': 'text/html; charset=utf-8'})
+    rutor = RuTor()
+    semaphore = rutor._host_semaphore('http://rutor.info/torrent/1')
+    slots = free_slots(semaphore)
+    resp = rutor.get_torrent_page(torrent_id=1, stream=True)
+    # host slot is taken until body is read
+    assert free_slots(semaphore) == slots - 1
+    page = rutor.read_page(resp=resp, url='http://rutor.info/torrent/1', stream=True)
+    resp.close()
+    assert free_slots(semaphore) == slots
+    assert len(resp.content) < len(text) / 2
+    assert (RuTor.get_title(page), RuTor.get_magnet(page)) == ('Series', MAGNET)
+    assert RuTor.get_poster(page) == 'http://img.example/poster.jpg'
+
+
+class SlowResponse(requests.Response):
+    """Streamed response with body chunks coming with delay"""
+
+    def __init__(self, chunks, delay):
+        super().__init__()
+        self.status_code = 200
+        self.encoding = 'utf-8'
+        self.headers['Content-Type'] = 'text/html; charset=utf-8'
+        self._chunks = chunks
+        self._delay = delay
+
+    def iter_content(self, chunk_size=1, decode_unicode=False):
+        for chunk in self._chunks:
+            time.sleep(self._delay)
+            yield chunk
+
+    def close(self):
+        pass
+
+
+def test_read_page_stream_parse_time():
+    text = f'<html><body><h1>Series</h1><div id="download"><a href="{MAGNET}">m</a></div>' + '<p>x</p>' * 100
+    chunks = [text[i:i + 100].encode('utf-8') for i in range(0, len(text), 100)] + [b'</body></html>']
+    page = RuTor.read_page(resp=SlowResponse(chunks=chunks, delay=0.02), url='http://rutor.info/torrent/1',
+                           stream=True)
+    assert RuTor.get_magnet(page) == MAGNET
+    # waiting for chunks is download, not parsing
+    assert page.parse_seconds < 0.02
+
+
+def test_read_page_stream_unknown_charset(requests_mock):
+    requests_mock.get('http://rutor.info/torrent/3', content=f'<h1>Series</h1><a href="{MAGNET}">m</a>'.encode(),
+                      headers={'Content-Type': 'text/html; charset=x-unknown'})
+    rutor = RuTor()
+    semaphore = rutor._host_semaphore('http://rutor.info/torrent/3')
+    slots = free_slots(semaphore)
+    resp = rutor.get_torrent_page(torrent_id=3, stream=True)
+    page = rutor.read_page(resp=resp, url='http://rutor.info/torrent/3', stream=True)
+    assert free_slots(semaphore) == slots
+    assert RuTor.get_title(page) == 'Series'
+
+
+def test_tracker_page_lazy_text():
+    calls = list()
+    page = TrackerPage(text=lambda: calls.append(1) or '<h1>Series</h1>')
+    assert calls == []
+    assert RuTor.get_title(page) == 'Series'
+    assert page.text == '<h1>Series</h1>'
+    assert calls == [1]
+
+
+def test_litrcc_feed_bad_dates(requests_mock):
+    items = [{'id': 'A', 'external_url': 'http://rutor.info/torrent/1', 'date_modified': '2024-01-01T10:00:00'},
+             {'id': 'B', 'external_url': 'http://rutor.info/torrent/1', 'date_modified': '2024-01-02T10:00:00'},
+             {'id': 'C', 'external_url': 'http://rutor.info/torrent/1', 'date_modified': 'yesterday'},
+             {'id': 'D', 'external_url': 'http://rutor.info/torrent/2'}]
+    requests_mock.get('https://litr.cc/feed/x/json', json={'items': items})
+    litrcc = LitrCC(url='https://litr.cc/feed/x/json')
+    assert sorted(t['id'] for t in litrcc.torrents_list) == ['b', 'd']
+
+
+def test_anidub_magnet_from_file_cached(requests_mock, tmp_path):
+    names = ('Series [720p]', 'Series [1080p]', 'Series [480p]')
+    links = ''.join(f'<div class="torrent"><div class="torrent_h"><a href="/get/{i}.torrent">t</a></div></div>'
+                    for i in range(len(names)))
+    page = TrackerPage(text=f'<html><body>{links}</body></html>', url='https://anidub.com/anime/x.html')
+    for i, name in enumerate(names):
+        content = f'd8:announce21:http://tr.example/ann4:infod4:name{len(name)}:{name}ee'.encode('utf-8')
+        requests_mock.get(f'https://anidub.com/get/{i}.torrent', content=content, headers={'ETag': f'"{i}"'})
+    t_hash = TorrentFile(file_content=content).get_hash()
+
+    assert AniDub(cache_dir=str(tmp_path)).get_magnet_from_file(page=page, name='Series [480p]') == \
+        f'magnet:?xt=urn:btih:{t_hash}&tr=http%3A%2F%2Ftr.example%2Fann'
+    assert (tmp_path / 'torrents' / f'{t_hash}.torrent').is_file()
+
+    requests_mock.reset_mock()
+    for i in range(len(names)):
+        requests_mock.get(f'https://anidub.com/get/{i}.torrent', status_code=304)
+    assert t_hash in AniDub(cache_dir=str(tmp_path)).get_magnet_from_file(page=page, name='Series [480p]')
+    assert requests_mock.last_request.headers.get('If-None-Match')
+
+    requests_mock.reset_mock()
+    assert t_hash in AniDub(cache_dir=str(tmp_path), file_ttl=3600).get_magnet_from_file(page=page,
+                                                                                          name='Series [480p]')
+    assert requests_mock.call_count == 0
+
+
+def test_anidub_file_cache_not_available(tmp_path):
+    (tmp_path / 'torrents').write_text('')
+    assert AniDub(cache_dir=str(tmp_path))._file_cache is None
+
+
+def test_piratbit_mirror_selection_and_failover(requests_mock, tmp_path):
+    requests_mock.get('https://piratbit.org/', exc=requests.ConnectTimeout)
+    requests_mock.get('https://pb.wtf/', text='ok')
+    requests_mock.get('https://5050.piratbit.fun/', status_code=502)
+    assert PiratBit(cache_dir=str(tmp_path)).select_mirror() == 'pb.wtf'
+    calls = requests_mock.call_count
+    tracker = PiratBit(cache_dir=str(tmp_path), retries=0)
+    assert tracker.select_mirror() == 'pb.wtf'
+    assert requests_mock.call_count == calls
+
+    requests_mock.get('https://pb.wtf/topic/1', status_code=503)
+    requests_mock.get('https://piratbit.org/topic/1', text='page')
+    assert tracker.get_torrent_page(torrent_id='1').text == 'page'
+    assert tracker.mirror == 'piratbit.org'
+    assert PiratBit(cache_dir=str(tmp_path)).select_mirror() == 'piratbit.org'
+
+
+def test_failover_closes_failed_response(requests_mock):
+    requests_mock.get('http://rutor.info/torrent/2', [{'status_code': 503}, {'text': '<h1>Series</h1>'}])
+    rutor = RuTor(retries=0)
+    rutor.failover = lambda resp, url: resp.status_code == 503
+    semaphore = rutor._host_semaphore('http://rutor.info/torrent/2')
+    slots = free_slots(semaphore)
+    resp = rutor.get_torrent_page(torrent_id=2, stream=True)
+    assert resp.status_code == 200
+    resp.close()
+    assert free_slots(semaphore) == slots
+
+
+def test_probe_mirrors_through_server_request(requests_mock, tmp_path):
+    TorrentsSource._hosts_health.clear()
+    requests_mock.get('https://piratbit.org/', status_code=502)
+    requests_mock.get('https://pb.wtf/', text='ok')
+    requests_mock.get('https://5050.piratbit.fun/', text='ok')
+    before = METRICS.get('requests_total', host='piratbit.org', status=502) or 0
+    tracker = PiratBit(cache_dir=str(tmp_path))
+    semaphore = tracker._host_semaphore('https://pb.wtf/')
+    slots = free_slots(semaphore)
+    assert tracker.probe_mirrors()[-1] == 'piratbit.org'
+    # probe is counted and not retried
+    assert METRICS.get('requests_total', host='piratbit.org', status=502) == before + 1
+    assert free_slots(semaphore) == slots
@@ -0,0 +1,218 @@
+#!/usr/bin/python3
+# -*- coding: utf-8 -*-
+# coding: utf8
+
+"""
+Tests for update_tracker_torrents
+"""
+
+
+import threading
+import requests
+from argparse import Namespace
+from series_updater import (RuTor, RUTOR, NnmClub, NNMCLUB, TorrentBy, TORRENTBY, PageCache, StateStore, METRICS,
+                            TorrServer, TorrentsSource, UpdatePlan, PlannedUpdate, update_tracker_torrents,
+                            run_trackers_updates, fetch_tracker_torrent)
+
+
+RUTOR_PAGE = ('<html><body><h1>Series {t_id}</h1>'
+              '<div id="download"><a href="magnet:?xt=urn:btih:{t_hash}&dn=rutor.info">magnet</a></div>'
+              '</body></html>')
+
+
+class FakeTorrServer:
+    # plan is applied by real TorrServer code with fake requests below
+    apply_plan = TorrServer.apply_plan
+    host_limit = 4
+
+    def __init__(self, torrents, requests_count=None):
+        self.torrents = torrents
+        self.added = list()
+        self.removed = list()
+        self.viewed = dict()
+        self.lock = threading.RLock()
+        self.secrets = dict()
+        # tracker requests count at the moment of each TorrServer change
+        self.requests_count = requests_count
+        self.changed_after = list()
+
+    def get_tracker_torrents(self, tracker_id=''):
+        return {t[tracker_id]: [t] for t in self.torrents if tracker_id in t}
+
+    def get_viewed_indexes(self, hashes):
+        return {1}
+
+    def _changed(self):
+        if self.requests_count:
+            self.changed_after.append(self.requests_count())
+
+    def add_torrent(self, torrent):
+        self._changed()
+        self.added.append(torrent)
+        return type('obj', (object,), {'status_code': 200})
+
+    def set_viewed_many(self, viewed):
+        self._changed()
+        self.viewed.update(viewed)
+        return {t_hash: len(indexes) for t_hash, indexes in viewed.items()}
+
+    def delete_torrents(self, hashes):
+        if hashes:
+            self._changed()
+        self.removed.extend(hashes)
+
+
+def test_update_tracker_torrents_concurrent(requests_mock):
+    torrents = list()
+    for t_id in range(1, 21):
+        old_hash = f'{t_id:040x}'
+        new_hash = old_hash if t_id % 2 else f'{t_id:040x}'.replace('0', 'a')
+        requests_mock.get(f'http://rutor.info/torrent/{t_id}', text=RUTOR_PAGE.format(t_id=t_id, t_hash=new_hash))
+        torrents.append({'rutor_id': str(t_id), 't_hash': old_hash, 'title': f'Series {t_id}'})
+    torrserver = FakeTorrServer(torrents=torrents, requests_count=lambda: requests_mock.call_count)
+    update_tracker_torrents(tracker=RUTOR, tracker_class=RuTor(), torrserver=torrserver, workers=4)
+    assert len(torrserver.added) == 10
+    assert sorted(torrserver.removed) == sorted(t['t_hash'] for t in torrents if int(t['rutor_id']) % 2 == 0)
+    assert len(torrserver.viewed) == 10
+    # TorrServer is changed only after all pages are checked
+    assert set(torrserver.changed_after) == {20}
+
+
+def test_update_tracker_torrents_plan_only(requests_mock):
+    requests_mock.get('http://rutor.info/torrent/1', text=RUTOR_PAGE.format(t_id=1, t_hash='b' * 40))
+    requests_mock.get('http://rutor.info/torrent/2', text=RUTOR_PAGE.format(t_id=2, t_hash='c' * 40))
+    torrserver = FakeTorrServer(torrents=[{'rutor_id': '1', 't_hash': 'a' * 40, 'title': 'Series 1'},
+                                          {'rutor_id': '2', 't_hash': 'c' * 40, 'title': 'Series 2'}])
+    plan = UpdatePlan()
+    summary = update_tracker_torrents(tracker=RUTOR, tracker_class=RuTor(), torrserver=torrserver, plan=plan)
+    assert summary['updated'] == 1
+    assert not torrserver.added and not torrserver.removed
+    update, = plan.updates
+    assert (update.source, update.topic_id, update.old_hashes, update.viewed) == ('rutor_id', '1', ('a' * 40,),
+                                                                                  frozenset({1}))
+    assert update.torrent.get('hash') == 'b' * 40
+    assert plan.describe()[-1] == 'Plan: 1 torrents to add, 1 to remove'
+
+
+def test_update_plan_merge_and_apply():
+    plan = UpdatePlan()
+    torrent = {'hash': 'b' * 40, 'title': 'Series 1'}
+    plan.add_update(update=PlannedUpdate(source='rutor_id', topic_id='1', title='Series 1', torrent=torrent,
+                                         old_hashes=('a' * 40,), viewed=frozenset({1})))
+    plan.add_update(update=PlannedUpdate(source='litrcc', topic_id='http://rutor.info/torrent/1', title='Series 1',
+                                         torrent=torrent, old_hashes=('c' * 40,), viewed=frozenset({2})))
+    plan.remove(hashes=['d' * 40, 'b' * 40], reason='duplicate')
+    torrserver = FakeTorrServer(torrents=[])
+    assert torrserver.apply_plan(plan) == 1
+    assert torrserver.added == [torrent]
+    assert torrserver.viewed == {'b' * 40: frozenset({1, 2})}
+    # new torrent is never deleted, even if it is planned for removal
+    assert sorted(torrserver.removed) == ['a' * 40, 'c' * 40, 'd' * 40]
+
+
+def test_update_tracker_torrents_metrics(requests_mock):
+    requests_mock.get('http://rutor.info/torrent/1', text=RUTOR_PAGE.format(t_id=1, t_hash='b' * 40))
+    torrserver = FakeTorrServer(torrents=[{'rutor_id': '1', 't_hash': 'a' * 40, 'title': 'Series 1'}])
+    found = METRICS.get('updates_found_total', tracker='rutor_id') or 0
+    parsed = (METRICS.get('parse_duration_seconds', source='RuTor') or {'count': 0})['count']
+    update_tracker_torrents(tracker=RUTOR, tracker_class=RuTor(), torrserver=torrserver)
+    assert METRICS.get('updates_found_total', tracker='rutor_id') == found + 1
+    assert METRICS.get('parse_duration_seconds', source='RuTor')['count'] == parsed + 1
+
+
+def test_update_tracker_torrents_page_not_available(requests_mock):
+    requests_mock.get('http://rutor.info/torrent/1', status_code=404)
+    torrserver = FakeTorrServer(torrents=[{'rutor_id': '1', 't_hash': 'a' * 40, 'title': 'Series 1'}])
+    update_tracker_torrents(tracker=RUTOR, tracker_class=RuTor(), torrserver=torrserver, workers=2)
+    assert not torrserver.added
+
+
+def test_fetch_tracker_torrent_failover_url(requests_mock):
+    TorrentsSource._hosts_health.clear()
+    requests_mock.get('http://rutor.info/torrent/1', status_code=503)
+    requests_mock.get('http://rutor.is/torrent/1', text=RUTOR_PAGE.format(t_id=1, t_hash='b' * 40))
+    rutor = RuTor(retries=0)
+    rutor.use_mirror('rutor.info')
+    page = fetch_tracker_torrent(tracker_class=rutor, torrent_id='1', torrents_list=[], torrserver=None)
+    assert page['hash'] == 'b' * 40
+    assert page['url'] == 'http://rutor.is/torrent/1'
+
+
+def test_run_trackers_updates_parallel(requests_mock):
+    requests_mock.get('http://rutor.info/torrent/1', text=RUTOR_PAGE.format(t_id=1, t_hash='b' * 40))
+    requests_mock.get('https://nnmclub.to/forum/viewtopic.php?t=2', status_code=404)
+    torrserver = FakeTorrServer(torrents=[{'rutor_id': '1', 't_hash': 'a' * 40, 'title': 'Series 1'},
+                                          {'nnmclub_id': '2', 't_hash': 'c' * 40, 'title': 'Series 2'}])
+    args = Namespace(parallel=True, proxy='', host_limit=2, workers=2, stream=False, cache_dir='', file_ttl=0,
+                     http2=False)
+    summaries = run_trackers_updates(trackers=[(RUTOR, RuTor), (NNMCLUB, NnmClub)], torrserver=torrserver, args=args)
+    summaries = {summary['tracker']: summary for summary in summaries}
+    assert summaries['rutor_id']['updated'] == 1
+    assert summaries['nnmclub_id']['unavailable'] == 1
+    assert torrserver.removed == ['a' * 40]
+
+
+def test_run_trackers_updates_sequential_keeps_thread_name(requests_mock):
+    requests_mock.get('http://rutor.info/torrent/1', text=RUTOR_PAGE.format(t_id=1, t_hash='b' * 40))
+    torrserver = FakeTorrServer(torrents=[{'rutor_id': '1', 't_hash': 'a' * 40, 'title': 'Series 1'}])
+    args = Namespace(parallel=False, proxy='', host_limit=2, workers=2, stream=False, cache_dir='', file_ttl=0,
+                     http2=False)
+    name = threading.current_thread().name
+    summaries = run_trackers_updates(trackers=[(RUTOR, RuTor)], torrserver=torrserver, args=args)
+    assert summaries[0]['updated'] == 1
+    assert threading.current_thread().name == name
+
+
+def test_update_tracker_torrents_not_modified(requests_mock, tmp_path):
+    page_cache = PageCache(path=str(tmp_path))
+    requests_mock.get('http://rutor.info/torrent/1', text=RUTOR_PAGE.format(t_id=1, t_hash='b' * 40),
+                      headers={'ETag': '"v1"'})
+    torrserver = FakeTorrServer(torrents=[{'rutor_id': '1', 't_hash': 'b' * 40, 'title': 'Series 1'}])
+    update_tracker_torrents(tracker=RUTOR, tracker_class=RuTor(), torrserver=torrserver, page_cache=page_cache)
+    assert page_cache.get('http://rutor.info/torrent/1').get('page').get('hash') == 'b' * 40
+
+    requests_mock.get('http://rutor.info/torrent/1', status_code=304)
+    torrserver = FakeTorrServer(torrents=[{'rutor_id': '1', 't_hash': 'a' * 40, 'title': 'Series 1'}])
+    update_tracker_torrents(tracker=RUTOR, tracker_class=RuTor(), torrserver=torrserver, page_cache=page_cache)
+    assert requests_mock.last_request.headers.get('If-None-Match') == '"v1"'
+    assert torrserver.added[0].get('hash') == 'b' * 40
+
+
+def test_update_tracker_torrents_skip_fresh(requests_mock, tmp_path):
+    state = StateStore(path=str(tmp_path / 'state.sqlite3'), recheck_after=3600)
+    requests_mock.get('http://rutor.info/torrent/1', text=RUTOR_PAGE.format(t_id=1, t_hash='a' * 40))
+    torrserver = FakeTorrServer(torrents=[{'rutor_id': '1', 't_hash': 'a' * 40, 'title': 'Series 1'}])
+    summary = update_tracker_torrents(tracker=RUTOR, tracker_class=RuTor(), torrserver=torrserver, state=state)
+    assert summary['checked'] == 1
+    summary = update_tracker_torrents(tracker=RUTOR, tracker_class=RuTor(), torrserver=torrserver, state=state)
+    assert summary['skipped'] == 1
+    assert requests_mock.call_count == 1
+
+
+def test_state_store_adaptive_interval(tmp_path):
+    state = StateStore(path=':memory:', recheck_after=1800, max_recheck_after=12 * 3600)
+    state.update(tracker='rutor_id', topic_id='1', infohash='a' * 40, now=0)
+    state.update(tracker='rutor_id', topic_id='1', infohash='a' * 40, now=100 * 3600)
+    # airing series changed recently: checked every 30 minutes
+    state.update(tracker='rutor_id', topic_id='2', infohash='b' * 40, now=100 * 3600)
+    assert not state.is_fresh(tracker='rutor_id', topic_id='2', hashes=['b' * 40], now=100 * 3600 + 1900)
+    # not changed for 100 hours: checked about every 10 hours
+    assert state.is_fresh(tracker='rutor_id', topic_id='1', hashes=['a' * 40], now=100 * 3600 + 9 * 3600)
+    assert not state.is_fresh(tracker='rutor_id', topic_id='1', hashes=['a' * 40], now=100 * 3600 + 12 * 3600)
+
+
+def test_update_tracker_torrents_host_down_pending(requests_mock, tmp_path):
+    state = StateStore(path=str(tmp_path / 'state.sqlite3'), recheck_after=3600)
+    torrents = [{'torrentby_id': str(t_id), 't_hash': f'{t_id:040x}', 'title': f'Series {t_id}'} for t_id in range(8)]
+    for torrent in torrents:
+        state.update(tracker='torrentby_id', topic_id=torrent['torrentby_id'], infohash=torrent['t_hash'], now=0)
+        requests_mock.get(f'https://torrent.by/{torrent["torrentby_id"]}', exc=requests.ConnectTimeout)
+    torrserver = FakeTorrServer(torrents=torrents)
+    summary = update_tracker_torrents(tracker=TORRENTBY, tracker_class=TorrentBy(retries=0), torrserver=torrserver,
+                                      state=state)
+    assert requests_mock.call_count == TorrentBy.circuit_failures
+    assert summary['postponed'] == 8 - TorrentBy.circuit_failures
+    assert summary['checked'] == TorrentBy.circuit_failures
+    assert len(state.get_pending(tracker='torrentby_id')) == summary['postponed']
+    assert not state.is_fresh(tracker='torrentby_id', topic_id=next(iter(state.get_pending('torrentby_id'))),
+                              hashes=[t['t_hash'] for t in torrents])
@@ -0,0 +1,32 @@
+#!/usr/bin/python3
+# -*- coding: utf-8 -*-
+# coding: utf8
+
+"""
+Tests for Updater
+"""
+
+
+from datetime import datetime
+from series_updater import Updater
+
+
+RELEASES_URL = 'https://api.github.com/repos/Mantikor/TorrserverSeriesUpdater/releases/latest'
+
+
+def test_latest_releases_cached(requests_mock, tmp_path):
+    requests_mock.get(RELEASES_URL, json={'tag_name': 'v9.9.9', 'name': 'release'})
+    assert Updater(cache_dir=str(tmp_path))._get_latest_releases().get('tag_name') == 'v9.9.9'
+    assert Updater(cache_dir=str(tmp_path))._get_latest_releases().get('tag_name') == 'v9.9.9'
+    assert requests_mock.call_count == 1
+    Updater(cache_dir=str(tmp_path), releases_ttl=-1)._get_latest_releases()
+    assert requests_mock.call_count == 2
+
+
+def test_scheduled_check_in_background(requests_mock, tmp_path):
+    requests_mock.get(RELEASES_URL, json={'tag_name': 'v0.0.1', 'name': 'release'})
+    updater = Updater(cache_dir=str(tmp_path))
+    updater.check_scheduled_updates(schedule=datetime.now().isoweekday())
+    updater.wait(timeout=5)
+    assert requests_mock.call_count == 1
+    assert (tmp_path / 'latest_release.json').is_file()